@@ -0,0 +1,179 @@
+"""
+This file contains the functions necessary for
+reading eyetracking data from an .asc file (an .edf file converted with edf2asc).
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+usage:
+
+   from ascparser import parse_asc
+
+   recording = parse_asc("1_23.asc")
+   recording["time"], recording["x"], recording["y"], recording["pupil"]
+   recording["triggers"]["frame"]
+   recording["fixation_breaks"]["time"]  # trials aborted by fixation control
+
+made by Anna van Harmelen, 2024
+"""
+
+from io import BytesIO
+import re
+import numpy as np
+import pandas as pd
+from triggers import decode
+
+CHUNK_SIZE = 16 * 1024 * 1024  # in bytes
+
+# Every line that doesn't start with a digit is not a sample
+NOT_A_SAMPLE = re.compile(rb"^(?:[^0-9\r\n][^\n]*)?\r?\n", re.MULTILINE)
+TRIGGER_MESSAGE = re.compile(rb"^MSG\s+(\d+)\s+trig(\d+)\s*$", re.MULTILINE)
+# Sent by main.py as 'fixation_broken <phase> <reason>' when a trial is aborted
+FIXATION_BROKEN_MESSAGE = re.compile(
+    rb"^MSG\s+(\d+)\s+fixation_broken\s+(\S+)\s+([^\r\n]*?)\s*$", re.MULTILINE
+)
+
+TRIGGER_DTYPE = np.dtype(
+    [
+        ("time", np.int64),
+        ("code", "U3"),
+        ("frame", "U17"),
+        ("probe_form", "U14"),
+        ("cue_form", "U12"),
+        ("congruency", "U11"),
+        ("target_position", "U5"),
+    ]
+)
+
+FIXATION_BREAK_DTYPE = np.dtype(
+    [("time", np.int64), ("phase", "U17"), ("reason", "U20")]
+)
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yields the file in chunks of whole lines, so memory use stays constant."""
+    with open(path, "rb") as file:
+        remainder = b""
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+
+            chunk = remainder + chunk
+            last_newline = chunk.rfind(b"\n")
+            if last_newline == -1:
+                remainder = chunk
+                continue
+
+            remainder = chunk[last_newline + 1 :]
+            yield chunk[: last_newline + 1]
+
+        if remainder:
+            yield remainder + b"\n"
+
+
+def parse_samples(chunk, eye="RIGHT", binocular=False):
+    """
+    Parses all sample lines in a chunk into (time, x, y, pupil) arrays.
+    Missing values (e.g. during blinks) become NaN.
+    """
+    samples = NOT_A_SAMPLE.sub(b"", chunk)
+    if not samples:
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), empty, empty, empty
+
+    # time, x, y, pupil for monocular recordings,
+    # time, left x, y, pupil, right x, y, pupil for binocular ones
+    if binocular:
+        columns = [0, 4, 5, 6] if eye == "RIGHT" else [0, 1, 2, 3]
+    else:
+        columns = [0, 1, 2, 3]
+
+    table = pd.read_csv(
+        BytesIO(samples),
+        sep=r"\s+",
+        header=None,
+        usecols=columns,
+        na_values=["."],
+        dtype=np.float64,
+        engine="c",
+    ).to_numpy()
+
+    return (
+        table[:, 0].astype(np.int64),
+        table[:, 1],
+        table[:, 2],
+        table[:, 3],
+    )
+
+
+def parse_triggers(chunk):
+    """Finds all 'trigXY' messages in a chunk and decodes them (see triggers.py)."""
+    messages = TRIGGER_MESSAGE.findall(chunk)
+    triggers = np.empty(len(messages), dtype=TRIGGER_DTYPE)
+
+    for index, (time, code) in enumerate(messages):
+        code = code.decode()
+        triggers[index] = (int(time), code, *decode(code))
+
+    return triggers
+
+
+def parse_fixation_breaks(chunk):
+    """Finds all 'fixation_broken <phase> <reason>' messages in a chunk."""
+    return np.array(
+        [
+            (int(time), phase.decode(), reason.decode())
+            for time, phase, reason in FIXATION_BROKEN_MESSAGE.findall(chunk)
+        ],
+        dtype=FIXATION_BREAK_DTYPE,
+    )
+
+
+def iter_asc(path, eye="RIGHT", binocular=False, chunk_size=CHUNK_SIZE):
+    """
+    Yields ((time, x, y, pupil), triggers, fixation breaks) for every chunk of the
+    file, use this directly to process recordings that don't fit in memory.
+    """
+    for chunk in read_chunks(path, chunk_size):
+        yield (
+            parse_samples(chunk, eye, binocular),
+            parse_triggers(chunk),
+            parse_fixation_breaks(chunk),
+        )
+
+
+def parse_asc(path, eye="RIGHT", binocular=False, chunk_size=CHUNK_SIZE):
+    """
+    Parses an .asc file into NumPy arrays of samples and structured arrays of
+    decoded trigger messages and fixation breaks.
+    """
+    times, xs, ys, pupils, triggers, fixation_breaks = [], [], [], [], [], []
+
+    for (time, x, y, pupil), chunk_triggers, chunk_fixation_breaks in iter_asc(
+        path, eye, binocular, chunk_size
+    ):
+        times.append(time)
+        xs.append(x)
+        ys.append(y)
+        pupils.append(pupil)
+        triggers.append(chunk_triggers)
+        fixation_breaks.append(chunk_fixation_breaks)
+
+    if not times:
+        return {
+            "time": np.empty(0, dtype=np.int64),
+            "x": np.empty(0),
+            "y": np.empty(0),
+            "pupil": np.empty(0),
+            "triggers": np.empty(0, dtype=TRIGGER_DTYPE),
+            "fixation_breaks": np.empty(0, dtype=FIXATION_BREAK_DTYPE),
+        }
+
+    return {
+        "time": np.concatenate(times),
+        "x": np.concatenate(xs),
+        "y": np.concatenate(ys),
+        "pupil": np.concatenate(pupils),
+        "triggers": np.concatenate(triggers),
+        "fixation_breaks": np.concatenate(fixation_breaks),
+    }
+
@@ -6,57 +6,11 @@ To run the 'location-by-colour null-cue' experiment, see main.py.
 made by Anna van Harmelen, 2024
 """
 
-import random
+from time import sleep
 from trial import show_text
 from response import wait_for_key
 
 
-def create_blocks(n_blocks, block_order):
-    if n_blocks % 4 != 0:
-        raise Exception("Expected number of blocks to be divisible by 4.")
-
-    # Generate equal distribution of probe forms over the blocks, but randomly order them
-    block_types = list()
-    for block_type in block_order:
-        if block_type == "C":
-            block_types.extend(n_blocks // 4 * ["colour_probe"])
-        elif block_type == "L":
-            block_types.extend(n_blocks // 4 * ["location_probe"])
-        else:
-            raise Exception("Expected block_type of 'C' or 'L'.")
-
-    # Do a quick checksum
-    if len(block_types) != n_blocks:
-        raise Exception("create_blocks() has created the wrong amount of blocks.")
-
-    # Save list of sets of block numbers (in order) + block types
-    blocks = list(zip(range(1, n_blocks + 1), block_types))
-
-    return blocks
-
-
-def create_trial_list(n_trials):
-    if n_trials % 8 != 0:
-        raise Exception("Expected number of trials to be divisible by 8.")
-
-    # Generate equal distribution of target locations
-    locations = n_trials // 2 * ["left"] + n_trials // 2 * ["right"]
-
-    # Generate equal distribution of congruencies,
-    # that co-occur equally with the target locations
-    congruencies = 2 * (n_trials // 4 * ["congruent"] + n_trials // 4 * ["incongruent"])
-
-    # Generate equal distribution of cue forms,
-    # that co-occur equally with both target locations and directions
-    cue_forms = 4 * (n_trials // 8 * ["colour_cue"] + n_trials // 8 * ["location_cue"])
-
-    # Create trial parameters for all trials
-    trials = list(zip(locations, congruencies, cue_forms))
-    random.shuffle(trials)
-
-    return trials
-
-
 def show_session_type(session_type, settings, eyetracker):
     show_text(
         "Next session: "
@@ -141,6 +95,34 @@ def long_break(n_blocks, settings, eyetracker):
     return False
 
 
+def fixation_break(settings):
+    show_text(
+        "Please keep looking at the central dot during the trial.",
+        settings["window"],
+    )
+    settings["window"].flip()
+    sleep(1)
+
+
+def fixation_pause(settings, eyetracker):
+    show_text(
+        "It seems hard to keep looking at the central dot right now. "
+        "Take a short break, but try not to move your head."
+        "\nPress SPACE when you're ready to continue.",
+        settings["window"],
+    )
+    settings["window"].flip()
+
+    # Experimenter can re-calibrate the eyetracker by pressing 'c' here
+    keys = wait_for_key(["space", "c"], settings["keyboard"])
+    if "c" in keys:
+        eyetracker.calibrate()
+        eyetracker.start()
+        return True
+
+    return False
+
+
 def finish(n_blocks, settings):
     show_text(
         f"Congratulations! You successfully finished all {n_blocks} blocks!"
@@ -0,0 +1,149 @@
+"""
+This file contains the functions necessary for
+linking the clock of this computer to the clock of the eyetracker.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Every so often (between trials and after breaks) the tracker time is read together
+with the local clock (time.perf_counter). A straight line through these pairs per block
+corrects for both the offset and the drift between the two clocks.
+
+usage (offline):
+
+   from clocksync import ClockSync
+
+   sync = ClockSync.load(r"...\\clock_sync_session_1.csv")
+   tracker_times = sync.to_tracker(local_times, blocks)
+
+made by Anna van Harmelen, 2024
+"""
+
+from time import perf_counter
+import numpy as np
+import pandas as pd
+
+READINGS_PER_SAMPLE = 3  # only the one with the shortest round trip is kept
+MIN_PAIRS_PER_BLOCK = 5  # blocks with fewer pairs use the fit of the whole session
+
+
+class ClockSync:
+    """
+    usage (during the experiment):
+
+       clock_sync = ClockSync(eyelinker.tracker.tracker_time)
+       clock_sync.sample(block_nr)
+       clock_sync.save(directory, session)
+    """
+
+    def __init__(self, tracker_time=None, clock=perf_counter):
+        self.tracker_time = tracker_time
+        self.clock = clock
+        self.pairs = []
+        self.fits = None
+
+    def sample(self, block):
+        """
+        Reads the tracker time a few times and saves the reading with the
+        shortest round trip, paired with the local time halfway the round trip.
+        """
+        best = None
+        for _ in range(READINGS_PER_SAMPLE):
+            before = self.clock()
+            tracker = self.tracker_time()
+            after = self.clock()
+
+            if best is None or after - before < best[3]:
+                best = (block, (before + after) / 2 * 1000, tracker, after - before)
+
+        self.pairs.append(best)
+        self.fits = None
+
+    def fit(self):
+        """
+        Fits tracker time (ms) = slope * local time (ms) + intercept per block,
+        plus one fit over all pairs (block 0), and returns them as a DataFrame.
+        """
+        pairs = pd.DataFrame(
+            self.pairs, columns=["block", "local_ms", "tracker_ms", "round_trip"]
+        )
+
+        fits = [fit_line(0, pairs)]
+        for block, block_pairs in pairs.groupby("block"):
+            if len(block_pairs) >= MIN_PAIRS_PER_BLOCK:
+                fits.append(fit_line(block, block_pairs))
+
+        self.fits = pd.DataFrame(fits).set_index("block")
+        return self.fits
+
+    def parameters(self, blocks):
+        """Returns slope and intercept arrays for an array of block numbers."""
+        if self.fits is None:
+            self.fit()
+
+        blocks = np.asarray(blocks)
+        known = np.isin(blocks, self.fits.index)
+        blocks = np.where(known, blocks, 0)
+
+        return (
+            self.fits["slope"].reindex(blocks.ravel()).to_numpy().reshape(blocks.shape),
+            self.fits["intercept"].reindex(blocks.ravel()).to_numpy().reshape(blocks.shape),
+        )
+
+    def to_tracker(self, local_ms, blocks=0):
+        """Converts local times (perf_counter, in ms) to tracker times (in ms)."""
+        slope, intercept = self.parameters(blocks)
+        return slope * np.asarray(local_ms, dtype=float) + intercept
+
+    def to_local(self, tracker_ms, blocks=0):
+        """Converts tracker times (in ms) to local times (perf_counter, in ms)."""
+        slope, intercept = self.parameters(blocks)
+        return (np.asarray(tracker_ms, dtype=float) - intercept) / slope
+
+    def save(self, directory, session, testing=False, start_of_experiment=None):
+        """
+        Saves the fits (and the start of the experiment, in local ms) and all
+        pairs, next to the trial data of the session.
+        """
+        fits = self.fit().copy()
+        fits["start_of_experiment_ms"] = (
+            None if start_of_experiment is None else start_of_experiment * 1000
+        )
+
+        fits.to_csv(
+            rf"{directory}\clock_sync_session_{session}{'_test' if testing else ''}.csv"
+        )
+        pd.DataFrame(
+            self.pairs, columns=["block", "local_ms", "tracker_ms", "round_trip"]
+        ).to_csv(
+            rf"{directory}\clock_pairs_session_{session}{'_test' if testing else ''}.csv",
+            index=False,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Loads saved fits, for converting times offline."""
+        sync = cls()
+        sync.fits = pd.read_csv(path, index_col="block")
+        return sync
+
+
+def fit_line(block, pairs):
+    # Centre the times, so the fit isn't affected by their large values
+    local = pairs.local_ms.to_numpy()
+    tracker = pairs.tracker_ms.to_numpy()
+    local_mean, tracker_mean = local.mean(), tracker.mean()
+
+    if len(pairs) > 1:
+        slope = np.polyfit(local - local_mean, tracker - tracker_mean, 1)[0]
+    else:
+        slope = 1.0
+
+    intercept = tracker_mean - slope * local_mean
+    residuals = tracker - (slope * local + intercept)
+
+    return {
+        "block": block,
+        "slope": slope,
+        "intercept": intercept,
+        "n_pairs": len(pairs),
+        "residual_sd_ms": residuals.std(),
+    }
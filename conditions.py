@@ -0,0 +1,109 @@
+"""
+This file contains the functions necessary for
+creating the blocks and trials of a session and the stimuli of every trial.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Nothing in here draws anything, so it's also used without psychopy (e.g. by
+simulation.py).
+
+made by Anna van Harmelen, 2024
+"""
+
+from record import TrialRecord
+import random
+
+# The design of a session (see main.py)
+N_BLOCKS = 16
+TRIALS_PER_BLOCK = 48
+
+COLOURS = [[19, 146, 206], [217, 103, 241], [101, 148, 14], [238, 104, 60]]
+COLOURS = [
+    [(rgb_value / 128 - 1) for rgb_value in rgb_triplet] for rgb_triplet in COLOURS
+]
+
+
+def create_blocks(n_blocks, block_order):
+    if n_blocks % 4 != 0:
+        raise Exception("Expected number of blocks to be divisible by 4.")
+
+    # Generate equal distribution of probe forms over the blocks, but randomly order them
+    block_types = list()
+    for block_type in block_order:
+        if block_type == "C":
+            block_types.extend(n_blocks // 4 * ["colour_probe"])
+        elif block_type == "L":
+            block_types.extend(n_blocks // 4 * ["location_probe"])
+        else:
+            raise Exception("Expected block_type of 'C' or 'L'.")
+
+    # Do a quick checksum
+    if len(block_types) != n_blocks:
+        raise Exception("create_blocks() has created the wrong amount of blocks.")
+
+    # Save list of sets of block numbers (in order) + block types
+    blocks = list(zip(range(1, n_blocks + 1), block_types))
+
+    return blocks
+
+
+def create_trial_list(n_trials):
+    if n_trials % 8 != 0:
+        raise Exception("Expected number of trials to be divisible by 8.")
+
+    # Generate equal distribution of target locations
+    locations = n_trials // 2 * ["left"] + n_trials // 2 * ["right"]
+
+    # Generate equal distribution of congruencies,
+    # that co-occur equally with the target locations
+    congruencies = 2 * (n_trials // 4 * ["congruent"] + n_trials // 4 * ["incongruent"])
+
+    # Generate equal distribution of cue forms,
+    # that co-occur equally with both target locations and directions
+    cue_forms = 4 * (n_trials // 8 * ["colour_cue"] + n_trials // 8 * ["location_cue"])
+
+    # Create trial parameters for all trials
+    trials = list(zip(locations, congruencies, cue_forms))
+    random.shuffle(trials)
+
+    return trials
+
+
+def generate_stimuli_characteristics(target_bar, congruency, cue_form, record=None):
+    """Fills in (and returns) the stimuli of a trial, in a new TrialRecord if not given."""
+    if record is None:
+        record = TrialRecord()
+
+    stimuli_colours = random.sample(COLOURS, 2)
+
+    orientations = [
+        random.choice([-1, 1]) * random.randint(5, 85),
+        random.choice([-1, 1]) * random.randint(5, 85),
+    ]
+
+    if target_bar == "left":
+        target_colour, distractor_colour = stimuli_colours
+        target_orientation = orientations[0]
+    else:
+        distractor_colour, target_colour = stimuli_colours
+        target_orientation = orientations[1]
+
+    if congruency == "congruent":
+        capture_colour = target_colour
+        capture_location = target_bar
+    elif congruency == "incongruent":
+        capture_colour = distractor_colour
+        capture_location = "right" if target_bar == "left" else "left"
+
+    record.ITI = random.randint(500, 800) / 1000
+    record.stimuli_colours = stimuli_colours
+    record.cue_form = cue_form
+    record.capture_colour = capture_colour
+    record.capture_location = capture_location
+    record.trial_condition = congruency
+    record.left_orientation = orientations[0]
+    record.right_orientation = orientations[1]
+    record.target_bar = target_bar
+    record.target_colour = target_colour
+    record.target_orientation = target_orientation
+
+    return record
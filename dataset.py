@@ -0,0 +1,354 @@
+"""
+This file contains the functions necessary for
+collecting all session files into one consolidated study dataset.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+usage (rebuilds the dataset in the data directory of the lab set-up):
+
+   python dataset.py
+
+made by Anna van Harmelen, 2024
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from ast import literal_eval
+import glob
+import os
+import re
+import pandas as pd
+from record import TRIAL_COLUMNS
+
+PARTICIPANT_COLUMNS = [
+    "participant_number",
+    "session_number",
+    "age",
+    "block_order",
+    "trials_completed",
+]
+
+INDEX = ["participant_number", "session_number", "trial_number"]
+
+SESSION_FILE = re.compile(r"data_session_(\d+)\.csv$")
+PARTICIPANT_FILE = "participantinfo.csv"
+
+
+def find_session_files(directory):
+    """
+    Returns {session_number: path} for every finished session in `directory`,
+    test sessions (data_session_X_test.csv) are skipped.
+    """
+    sessions = {}
+    for path in glob.glob(os.path.join(directory, "data_session_*.csv")):
+        match = SESSION_FILE.search(os.path.basename(path))
+        if match:
+            sessions[int(match.group(1))] = path
+
+    return dict(sorted(sessions.items()))
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def normalise_session(data: pd.DataFrame, session_number):
+    """
+    Brings one raw session file to the trial schema written by main.py.
+    Columns that are missing (e.g. from older versions of the experiment) are
+    added as empty columns, so all sessions can be concatenated.
+    """
+    data = data.copy()
+
+    for column, kind in TRIAL_COLUMNS.items():
+        if column not in data:
+            data[column] = pd.NA
+            continue
+
+        if kind == "timedelta":
+            data[column] = pd.to_timedelta(data[column])
+        elif kind == "list":
+            data[column] = data[column].map(
+                lambda value: literal_eval(value) if isinstance(value, str) else value
+            )
+        elif kind is bool:
+            # Missing values (e.g. sessions from before the column existed) stay
+            # missing instead of becoming False
+            data[column] = (
+                data[column]
+                .map({True: True, False: False, "True": True, "False": False})
+                .astype("boolean")
+            )
+        elif kind is str:
+            data[column] = data[column].astype("string")
+        elif kind is int:
+            data[column] = data[column].astype("Int64")
+        else:
+            data[column] = data[column].astype(kind)
+
+    data = data[list(TRIAL_COLUMNS)]
+    data.insert(0, "session_number", session_number)
+
+    return data
+
+
+def parse_session(session_number, path):
+    """Reads and normalises one session file, runs in a worker process."""
+    data = pd.read_csv(path, dtype={"condition_code": str})
+    return session_number, normalise_session(data, session_number)
+
+
+def read_partition(path, session_numbers):
+    """
+    Reads the rows of `session_numbers` back from a partition, without the
+    participant columns, runs in a worker process.
+    """
+    data = pd.read_csv(path, dtype={"condition_code": str})
+    data = data[data.session_number.isin(session_numbers)]
+
+    return {
+        session_number: normalise_session(rows, session_number)
+        for session_number, rows in data.groupby("session_number")
+    }
+
+
+def read_participants(directory):
+    return pd.read_csv(
+        os.path.join(directory, PARTICIPANT_FILE),
+        dtype={
+            "participant_number": int,
+            "session_number": int,
+            "age": int,
+            "block_order": str,
+            "trials_completed": str,
+        },
+    )
+
+
+def read_manifest(output_directory):
+    path = os.path.join(output_directory, "manifest.csv")
+    if not os.path.exists(path):
+        return pd.DataFrame(
+            columns=["session_number", "participant_number", "source", "size", "mtime_ns"]
+        )
+
+    return pd.read_csv(path)
+
+
+def build_dataset(directory, output_directory=None, max_workers=None):
+    """
+    Builds (or updates) the consolidated study dataset.
+
+    Every session file is parsed in a process pool, joined with its participant
+    metadata and written to one .csv per participant in `output_directory`
+    (default: `directory`/dataset). A manifest keeps the size and modification
+    time of every source file, so only new or changed sessions are reparsed. The
+    partitions of participants whose sessions were added, changed, deleted or moved
+    are rewritten, and all of them if participantinfo.csv changed (which main.py
+    does after every session), taking the unchanged sessions from the partitions.
+
+    Returns the full dataset, indexed by participant, session and trial number.
+    """
+    if output_directory is None:
+        output_directory = os.path.join(directory, "dataset")
+    os.makedirs(output_directory, exist_ok=True)
+
+    participants = read_participants(directory)[PARTICIPANT_COLUMNS]
+    sessions = find_session_files(directory)
+    manifest = read_manifest(output_directory)
+
+    # The participant info has its own row in the manifest (without session number)
+    is_participant_file = manifest.source == PARTICIPANT_FILE
+    participant_file = manifest[is_participant_file]
+    manifest = manifest[~is_participant_file].set_index("session_number")
+    participant_signature = file_signature(os.path.join(directory, PARTICIPANT_FILE))
+    participant_file_changed = participant_file[
+        ["size", "mtime_ns"]
+    ].values.tolist() != [list(participant_signature)]
+
+    # Find out which sessions have to be (re)parsed
+    changed = {}
+    for session_number, path in sessions.items():
+        size, mtime_ns = file_signature(path)
+        if (
+            session_number not in manifest.index
+            or manifest.loc[session_number, "size"] != size
+            or manifest.loc[session_number, "mtime_ns"] != mtime_ns
+        ):
+            changed[session_number] = path
+
+    # Participants whose partition has to be rewritten
+    session_to_participant = participants.set_index("session_number")[
+        "participant_number"
+    ]
+    dirty_participants = {
+        session_to_participant[session]
+        for session in changed
+        if session in session_to_participant.index
+    }
+
+    # Sessions that were deleted or moved to another participant (e.g. when a
+    # session was parsed before its participant was registered) change both the
+    # old and the new partition
+    for session_number, old_participant in manifest.participant_number.items():
+        session_number = int(session_number)
+        old_participant = None if pd.isna(old_participant) else int(old_participant)
+        new_participant = (
+            session_to_participant.get(session_number)
+            if session_number in sessions
+            else None
+        )
+
+        if old_participant != new_participant:
+            dirty_participants |= {
+                participant
+                for participant in (old_participant, new_participant)
+                if participant is not None
+            }
+
+    # A corrected participant info (age, block order, ...) changes every partition
+    if participant_file_changed:
+        dirty_participants |= set(participants.participant_number)
+        dirty_participants |= {
+            int(participant)
+            for participant in manifest.participant_number.dropna()
+        }
+
+    # The unchanged sessions of these participants are read back from the partition
+    # they're in, only sessions that aren't in a partition yet are parsed again
+    kept = {}
+    for participant in dirty_participants:
+        for session_number in participants.loc[
+            participants.participant_number == participant, "session_number"
+        ]:
+            if session_number not in sessions or session_number in changed:
+                continue
+
+            old_participant = manifest.participant_number.get(session_number)
+            if not pd.isna(old_participant) and os.path.exists(
+                partition_path(output_directory, int(old_participant))
+            ):
+                kept.setdefault(
+                    partition_path(output_directory, int(old_participant)), []
+                ).append(session_number)
+            else:
+                changed[session_number] = sessions[session_number]
+
+    # Parse all changed sessions and read back the kept ones in parallel
+    parsed = {}
+    if changed or kept:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parsing = pool.map(parse_session, changed.keys(), changed.values())
+            reading = pool.map(read_partition, kept.keys(), kept.values())
+
+            for session_number, data in parsing:
+                parsed[session_number] = data
+            for partition in reading:
+                parsed.update(partition)
+
+    # Rebuild partitions of participants with changed sessions, with the current
+    # participant info
+    for participant in dirty_participants:
+        participant_sessions = participants.loc[
+            participants.participant_number == participant, "session_number"
+        ]
+
+        frames = [
+            parsed[session_number]
+            for session_number in participant_sessions
+            if session_number in parsed
+        ]
+
+        # No sessions left (deleted, or moved to another participant)
+        if not frames:
+            if os.path.exists(partition_path(output_directory, participant)):
+                os.remove(partition_path(output_directory, participant))
+            continue
+
+        data = pd.concat(frames, ignore_index=True).merge(
+            participants, on="session_number", how="left"
+        )
+        data = data[PARTICIPANT_COLUMNS + list(TRIAL_COLUMNS)]
+        data.to_csv(partition_path(output_directory, participant), index=False)
+
+    # Save the new manifest
+    new_manifest = pd.DataFrame(
+        [
+            {
+                "session_number": session_number,
+                "participant_number": session_to_participant.get(session_number),
+                "source": os.path.basename(path),
+                "size": file_signature(path)[0],
+                "mtime_ns": file_signature(path)[1],
+            }
+            for session_number, path in sessions.items()
+        ]
+        + [
+            {
+                "session_number": None,
+                "participant_number": None,
+                "source": PARTICIPANT_FILE,
+                "size": participant_signature[0],
+                "mtime_ns": participant_signature[1],
+            }
+        ]
+    )
+    new_manifest = new_manifest.astype(
+        {"session_number": "Int64", "participant_number": "Int64"}
+    )
+    new_manifest.to_csv(os.path.join(output_directory, "manifest.csv"), index=False)
+
+    return load_dataset(output_directory)
+
+
+def partition_path(output_directory, participant):
+    return os.path.join(output_directory, f"participant_{participant}.csv")
+
+
+def load_dataset(output_directory, participants=None):
+    """
+    Loads the consolidated dataset (or only the partitions of `participants`),
+    indexed by participant, session and trial number.
+    """
+    if participants is None:
+        paths = sorted(glob.glob(os.path.join(output_directory, "participant_*.csv")))
+    else:
+        paths = [partition_path(output_directory, p) for p in participants]
+
+    if not paths:
+        return pd.DataFrame(columns=PARTICIPANT_COLUMNS + list(TRIAL_COLUMNS)).set_index(
+            INDEX
+        )
+
+    data = pd.concat(
+        [pd.read_csv(path, dtype={"condition_code": str}) for path in paths],
+        ignore_index=True,
+    )
+
+    for column, kind in TRIAL_COLUMNS.items():
+        if kind == "timedelta":
+            data[column] = pd.to_timedelta(data[column])
+        elif kind == "list":
+            data[column] = data[column].map(
+                lambda value: literal_eval(value) if isinstance(value, str) else value
+            )
+        elif kind is bool:
+            data[column] = data[column].astype("boolean")
+
+    return data.set_index(INDEX).sort_index()
+
+
+def main():
+    # Only needed here, so worker processes don't have to import psychopy
+    from set_up import get_monitor_and_dir
+
+    _, directory = get_monitor_and_dir(False)
+    data = build_dataset(directory)
+
+    print(
+        f"Dataset contains {len(data)} trials of "
+        f"{data.index.get_level_values('participant_number').nunique()} participants."
+    )
+
+
+if __name__ == "__main__":
+    main()
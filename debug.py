@@ -11,15 +11,15 @@ from participantinfo import get_participant_details
 from math import atan2, degrees
 import time
 from set_up import get_monitor_and_dir, get_settings
-from trial import generate_stimuli_characteristics, single_trial
-from block import create_blocks
+from trial import single_trial
+from conditions import create_blocks, generate_stimuli_characteristics
 from response import get_response
-from eyetracker import get_trigger
+from triggers import get_trigger
 from practice import practice
 
 
 monitor, directory = get_monitor_and_dir(True)
-settings = get_settings(monitor, directory)
+settings = get_settings(monitor, directory, True)
 
 practice("start", settings)
 
@@ -53,13 +53,13 @@ print(blocks)
 window = settings["window"]
 deg2pix = settings["deg2pix"]
 
-stimuli_characteristics: dict = generate_stimuli_characteristics(
+stimuli_characteristics = generate_stimuli_characteristics(
     "right", "incongruent", "location"
 )
 
 # Generate trial
-report: dict = single_trial(
-    **stimuli_characteristics,
+report = single_trial(
+    stimuli_characteristics,
     settings=settings,
     testing=True,
     eyetracker=None,
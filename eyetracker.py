@@ -8,6 +8,12 @@ made by Anna van Harmelen, 2023, using code by Rose Nasrawi
 
 from lib import eyelinker
 from psychopy import event
+from triggers import decode
+from string import ascii_lowercase
+from tracing import traced
+from threading import Thread
+import pandas as pd
+import hashlib
 import os
 
 
@@ -21,6 +27,11 @@ class Eyelinker:
 
        eyelinker = Eyelinker(participant, session, window, directory)
        eyelinker.calibrate()
+
+    The recording is split into segments (one .edf file each, '{session}_{participant}a.edf',
+    '...b.edf', etc.) with `new_segment`. Finished segments are transferred in the background
+    while the participant has a break, and listed in 'edf_manifest_{session}_{participant}.csv'
+    so the whole session can be put back together in order.
     """
 
     def __init__(self, participant, session, window, directory) -> None:
@@ -29,43 +40,184 @@ class Eyelinker:
         """
         self.directory = directory
         self.window = window
+        self.name = f"{session}_{participant}"
+        self.segment = 0
+        self.first_block = 1
+        self.recording = False
+        self.edf_open = True
+        self.transfers = []
+        self.manifest = []
+
+        # Optionally, a function to run after every calibration
+        self.after_calibration = None
+
         self.tracker = eyelinker.EyeLinker(
-            window=window, eye="RIGHT", filename=f"{session}_{participant}.edf"
+            window=window,
+            eye="RIGHT",
+            filename=self.segment_filename(0),
+            mock_settings={"cue_side": capture_cue_side},
         )
         self.tracker.init_tracker()
 
+    def segment_filename(self, segment):
+        return f"{self.name}{ascii_lowercase[segment]}.edf"
+
+    @traced()
     def start(self):
+        if self.recording:
+            return
+
+        # The tracker can't record while it's still sending a file
+        self.wait_for_transfers()
+
+        if not self.edf_open:
+            self.tracker.open_edf(self.segment_filename(self.segment))
+            self.tracker.initialize_tracker()
+            self.edf_open = True
+
         self.tracker.start_recording()
+        self.recording = True
 
+        # Keep the most recent gaze samples in memory for online gaze checks
+        self.tracker.start_gaze_buffer()
+
+    @traced()
     def calibrate(self):
+        # The link is only read by the tracker set-up during calibration
+        self.tracker.stop_gaze_buffer()
+        self.wait_for_transfers()
         self.tracker.calibrate()
 
-    def stop(self):
-        os.chdir(self.directory)
+        # Calibrating stops the recording
+        self.recording = False
+
+        if self.after_calibration:
+            self.after_calibration()
+
+    @traced()
+    def new_segment(self, next_block):
+        """
+        Stops recording and closes the current .edf file, which is then transferred
+        in the background. The next segment starts (from `next_block` on) with `start`.
+        """
+        self.tracker.stop_gaze_buffer()
+        if self.recording:
+            self.tracker.stop_recording()
+            self.recording = False
 
-        self.tracker.stop_recording()
-        self.tracker.transfer_edf()
         self.tracker.close_edf()
+        self.edf_open = False
+
+        # Without silencing stdout, which would also silence the main thread
+        transfer = Thread(
+            target=self.transfer,
+            args=(self.close_segment(next_block - 1),),
+            kwargs={"quiet": False},
+            daemon=True,
+        )
+        transfer.start()
+        self.transfers.append(transfer)
+
+        self.segment += 1
+        self.first_block = next_block
+
+    def close_segment(self, last_block):
+        entry = {
+            "segment": self.segment,
+            "edf_file": self.segment_filename(self.segment),
+            "first_block": self.first_block,
+            "last_block": last_block,
+            "size": None,
+            "sha256": None,
+            "transferred": False,
+        }
+        self.manifest.append(entry)
+
+        return entry
+
+    @traced()
+    def transfer(self, entry, attempts=3, quiet=True):
+        """
+        Transfers one closed segment and checks that it arrived completely. Only
+        transfers in the main thread can be `quiet` (see transfer_edf).
+        """
+        path = os.path.join(self.directory, entry["edf_file"])
+
+        # The MockEyeLinker writes an .asc file instead
+        received = path[:-4] + ".asc" if self.tracker.mock else path
+
+        for _ in range(attempts):
+            try:
+                size = self.tracker.transfer_edf(path, entry["edf_file"], quiet)
+            except RuntimeError as error:
+                print(f"Transfer of {entry['edf_file']} failed: {error}")
+                continue
+
+            # The tracker reports 0 or a negative size if the transfer failed
+            if size is not None and size <= 0:
+                continue
+
+            if (
+                os.path.exists(received)
+                and os.path.getsize(received) > 0
+                and (size is None or os.path.getsize(received) == size)
+            ):
+                entry["size"] = os.path.getsize(received)
+                entry["sha256"] = file_hash(received)
+                entry["transferred"] = True
+                break
+
+        self.save_manifest()
+
+    @traced()
+    def wait_for_transfers(self):
+        for transfer in self.transfers:
+            transfer.join()
+
+        self.transfers = []
+
+    def save_manifest(self):
+        pd.DataFrame(self.manifest).astype({"last_block": "Int64"}).to_csv(
+            os.path.join(self.directory, f"edf_manifest_{self.name}.csv"), index=False
+        )
+
+    @traced()
+    def stop(self):
+        self.tracker.stop_gaze_buffer()
+        if self.recording:
+            self.tracker.stop_recording()
+            self.recording = False
 
+        self.wait_for_transfers()
 
-def get_trigger(frame, probe_form, capture_form, congruency, target_position):
-    condition_marker = {"location_probe": 1, "colour_probe": 9}[probe_form]
+        # Only the last segment still has to be transferred
+        if self.edf_open:
+            self.tracker.close_edf()
+            self.edf_open = False
+            self.transfer(self.close_segment(None))
 
-    if capture_form == "colour_cue":
-        condition_marker += 4
 
-    if congruency == "incongruent":
-        condition_marker += 2
+def file_hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def capture_cue_side(message):
+    """
+    Returns the side the capture cue in `message` points at ('left' or 'right'),
+    or None if the message isn't a capture cue trigger. Used by the MockEyeLinker
+    to bias its synthetic gaze.
+    """
+    if not message.startswith("trig2"):
+        return None
+
+    trigger = decode(message[len("trig") :])
 
-    if target_position == "right":
-        condition_marker += 1
+    if trigger.congruency == "congruent":
+        return trigger.target_position
 
-    return {
-        "just_code_please": "",
-        "stimuli_onset": "1",
-        "capture_cue_onset": "2",
-        "probe_cue_onset": "3",
-        "response_onset": "4",
-        "response_offset": "5",
-        "feedback_onset": "6",
-    }[frame] + str(condition_marker)
+    return "right" if trigger.target_position == "left" else "left"
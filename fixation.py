@@ -0,0 +1,62 @@
+"""
+This file contains the functions necessary for
+checking whether the participant keeps fixating during a trial.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+made by Anna van Harmelen, 2024
+"""
+
+from lib.gazedetection import centre_to_top_left, in_window
+
+FIXATION_WINDOW = 1.5  # radius in degrees around the fixation dot
+FIXATION_PHASES = ("stimuli_onset", "capture_cue_onset")  # frames to check
+RECALIBRATE_AFTER = 3  # broken trials in a row before the experimenter gets a pause
+
+# Broken trials are rescheduled until they're completed, so every condition is kept.
+# Set this to e.g. 5 to drop a condition after that many repeats instead, it's then
+# saved in the trial data (with dropped set and without a response).
+MAX_REPEATS = None
+
+
+class FixationBroken(Exception):
+    def __init__(self, phase, reason):
+        super().__init__(f"Fixation broken during {phase}: {reason}")
+        self.phase = phase
+        self.reason = reason
+
+
+def phase_start(eyetracker):
+    """
+    Returns the tracker time of the newest gaze sample,
+    or None if there's no gaze buffer to check.
+    """
+    reader = eyetracker.tracker.gaze_reader
+    if reader is None:
+        return None
+
+    newest = reader.samples.newest()
+    return None if newest is None else int(newest["time"])
+
+
+def check_fixation(eyetracker, settings, phase, start_time):
+    """
+    Checks all gaze samples since `start_time` against the fixation window,
+    raises FixationBroken if the participant blinked or looked away.
+    """
+    reader = eyetracker.tracker.gaze_reader
+    if reader is None or start_time is None:
+        return
+
+    samples = reader.samples.since(start_time)
+    if not len(samples):
+        return
+
+    if not samples["valid"].all():
+        raise FixationBroken(phase, "blink")
+
+    # Gaze is in tracker coordinates, with (0, 0) in the top left
+    centre = centre_to_top_left(0, 0, eyetracker.tracker.resolution)
+    radius = settings["deg2pix"](FIXATION_WINDOW)
+
+    if not in_window(samples, centre, radius).all():
+        raise FixationBroken(phase, "left fixation window")
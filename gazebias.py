@@ -0,0 +1,440 @@
+"""
+This file contains the functions necessary for
+computing the gaze bias after the capture cue and testing it over time.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Gaze is cut into epochs around every capture cue trigger ('2X', see triggers.py),
+except in trials that fixation control aborted (see main.py), which are excluded. It's
+then baselined and turned into towardness: the horizontal gaze position (in degrees)
+towards the side the capture cue points at (or towards the target bar). The epochs are
+averaged per condition, per participant, and these averages are cached in the data
+directory, so only new (or changed) recordings are read again. The group time
+courses are then tested against 0 with cluster-based permutation tests (Maris &
+Oostenveld, 2007), with the permutations spread across a process pool.
+
+usage (reads the .asc files in the data directory of the lab set-up):
+
+   python gazebias.py --output gaze_bias.csv
+
+made by Anna van Harmelen, 2024
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from math import atan2, degrees
+import argparse
+import json
+import glob
+import os
+import re
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import stats
+from ascparser import parse_asc
+from dataset import file_signature, read_participants
+from triggers import PROBE_FORMS, CUE_FORMS, CONGRUENCIES
+from lib.gazedetection import top_left_to_centre, runs
+
+EPOCH = (-500, 1500)  # in ms around the capture cue onset
+BASELINE = (-250, 0)  # in ms, subtracted from every epoch
+SAMPLE_INTERVAL = 1  # in ms, the EyeLink records at 1000 Hz
+
+# The conditions the epochs are averaged over, the target position is collapsed by
+# turning gaze into towardness
+CONDITIONS = list(product(PROBE_FORMS, CUE_FORMS, CONGRUENCIES))
+REFERENCES = ("capture_cue", "target")
+
+CACHE_DIRECTORY = "gaze_cache"
+
+PERMUTATIONS = 10000
+PERMUTATIONS_PER_CHUNK = 500
+CLUSTER_ALPHA = 0.05  # two-sided threshold on the t-values that form clusters
+
+
+def epoch_times(epoch=EPOCH):
+    return np.arange(epoch[0], epoch[1], SAMPLE_INTERVAL)
+
+
+def aborted(recording, triggers):
+    """
+    Which capture cue `triggers` belong to trials that were aborted, i.e. are followed
+    by a 'fixation_broken' message before the next probe cue.
+    """
+    probes = np.sort(
+        recording["triggers"]["time"][
+            recording["triggers"]["frame"] == "probe_cue_onset"
+        ]
+    )
+    next_probe = np.append(probes, np.iinfo(np.int64).max)[
+        np.searchsorted(probes, triggers["time"], side="right")
+    ]
+
+    # Number of breaks between every capture cue and the next probe cue
+    breaks = np.sort(recording["fixation_breaks"]["time"])
+    return np.searchsorted(breaks, next_probe) > np.searchsorted(
+        breaks, triggers["time"], side="right"
+    )
+
+
+def epochs(recording, screen, epoch=EPOCH):
+    """
+    Cuts the horizontal gaze (in pixels from the centre of the screen) of a recording
+    (see ascparser.parse_asc) into epochs around the capture cue triggers, leaving out
+    aborted trials. Returns the (epochs, samples) gaze, NaN where samples are missing,
+    the triggers of the epochs and the triggers of the aborted trials.
+    """
+    triggers = recording["triggers"]
+    triggers = triggers[triggers["frame"] == "capture_cue_onset"]
+
+    excluded = aborted(recording, triggers)
+    triggers, excluded = triggers[~excluded], triggers[excluded]
+
+    # All sample times of all epochs at once
+    wanted = triggers["time"][:, None] + epoch_times(epoch)[None, :]
+    found = np.clip(
+        np.searchsorted(recording["time"], wanted), 0, len(recording["time"]) - 1
+    )
+
+    x, _ = top_left_to_centre(recording["x"], recording["y"], screen)
+    if len(x):
+        gaze = np.where(recording["time"][found] == wanted, x[found], np.nan)
+    else:
+        gaze = np.full(wanted.shape, np.nan)
+
+    return gaze, triggers, excluded
+
+
+def towardness(
+    gaze, triggers, pixels_per_degree, reference="capture_cue", epoch=EPOCH
+):
+    """
+    Turns epochs of horizontal gaze into towardness (in degrees): baselined gaze
+    position, positive when towards the side of `reference`.
+    """
+    if reference == "target":
+        side = triggers["target_position"]
+    elif reference == "capture_cue":
+        # The capture cue points at the target in congruent trials, else away from it
+        side = np.where(
+            triggers["congruency"] == "congruent",
+            triggers["target_position"],
+            np.where(triggers["target_position"] == "left", "right", "left"),
+        )
+    else:
+        raise Exception(f"Expected one of {REFERENCES}, but received {reference!r}.")
+
+    times = epoch_times(epoch)
+    baseline = (times >= BASELINE[0]) & (times < BASELINE[1])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # no baseline samples
+        gaze = gaze - np.nanmean(gaze[:, baseline], axis=1, keepdims=True)
+
+    return np.where(side == "right", 1, -1)[:, None] * gaze / pixels_per_degree
+
+
+def in_condition(triggers, condition):
+    probe_form, cue_form, congruency = condition
+    return (
+        (triggers["probe_form"] == probe_form)
+        & (triggers["cue_form"] == cue_form)
+        & (triggers["congruency"] == congruency)
+    )
+
+
+def condition_counts(triggers):
+    return np.array(
+        [in_condition(triggers, condition).sum() for condition in CONDITIONS]
+    )
+
+
+def condition_averages(toward, triggers):
+    """Returns the average towardness (conditions, samples) and epochs per condition."""
+    averages = np.full((len(CONDITIONS), toward.shape[1]), np.nan)
+    counts = condition_counts(triggers)
+
+    for index, condition in enumerate(CONDITIONS):
+        selected = in_condition(triggers, condition)
+        if counts[index]:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # missing everywhere
+                averages[index] = np.nanmean(toward[selected], axis=0)
+
+    return averages, counts
+
+
+def find_recordings(directory, participant, sessions):
+    """All (segment) .asc files of the sessions of one participant, in order."""
+    paths = []
+    for session in sessions:
+        pattern = re.compile(rf"{session}_{participant}[a-z]?\.asc")
+        paths.extend(
+            sorted(
+                path
+                for path in glob.glob(
+                    os.path.join(directory, f"{session}_{participant}*.asc")
+                )
+                if pattern.fullmatch(os.path.basename(path))
+            )
+        )
+
+    return paths
+
+
+def participant_time_courses(paths, cache_path, screen, pixels_per_degree, reference):
+    """
+    Returns the condition averages, the epoch counts and the excluded (aborted) epoch
+    counts of one participant, from the cache if neither the recordings nor the
+    parameters changed. Runs in a worker.
+    """
+    signature = json.dumps(
+        {
+            "recordings": [
+                [os.path.basename(path), *file_signature(path)] for path in paths
+            ],
+            "screen": list(screen),
+            "pixels_per_degree": pixels_per_degree,
+            "reference": reference,
+            "epoch": EPOCH,
+            "baseline": BASELINE,
+            "excluded": "fixation_broken",
+        }
+    )
+
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if str(cached["signature"]) == signature:
+                return cached["averages"], cached["counts"], cached["excluded"]
+
+    gazes, all_triggers, all_excluded = [], [], []
+    for path in paths:
+        gaze, triggers, excluded = epochs(parse_asc(path), screen)
+        gazes.append(gaze)
+        all_triggers.append(triggers)
+        all_excluded.append(excluded)
+
+    triggers = np.concatenate(all_triggers)
+    excluded = condition_counts(np.concatenate(all_excluded))
+    averages, counts = condition_averages(
+        towardness(np.concatenate(gazes), triggers, pixels_per_degree, reference),
+        triggers,
+    )
+
+    np.savez(
+        cache_path,
+        signature=signature,
+        averages=averages,
+        counts=counts,
+        excluded=excluded,
+    )
+
+    return averages, counts, excluded
+
+
+def build_time_courses(
+    directory, participants, screen, pixels_per_degree, reference, max_workers=None
+):
+    """
+    Returns the condition averages of all `participants` (a participantinfo table)
+    as a (participants, conditions, samples) array, and the epoch counts and excluded
+    epoch counts as (participants, conditions) arrays. Participants without recordings
+    are left out, those without a cache are processed in parallel.
+    """
+    cache_directory = os.path.join(directory, CACHE_DIRECTORY)
+    os.makedirs(cache_directory, exist_ok=True)
+
+    numbers, tasks = [], []
+    for participant, sessions in participants.groupby("participant_number"):
+        paths = find_recordings(directory, participant, sessions.session_number)
+        if paths:
+            numbers.append(participant)
+            tasks.append(
+                (
+                    paths,
+                    os.path.join(cache_directory, f"participant_{participant}.npz"),
+                )
+            )
+
+    if not tasks:
+        raise Exception(f"Expected .asc files in {directory}, but found none.")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = list(
+            pool.map(
+                participant_time_courses,
+                [paths for paths, _ in tasks],
+                [cache_path for _, cache_path in tasks],
+                [screen] * len(tasks),
+                [pixels_per_degree] * len(tasks),
+                [reference] * len(tasks),
+            )
+        )
+
+    return (
+        numbers,
+        np.stack([averages for averages, _, _ in results]),
+        np.stack([counts for _, counts, _ in results]),
+        np.stack([excluded for _, _, excluded in results]),
+    )
+
+
+def t_values(flips, data):
+    """
+    One-sample t-values of `data` (participants, samples) after flipping the sign of
+    participants with every row of `flips` (permutations, participants).
+    """
+    n = len(data)
+    means = flips @ data / n
+
+    # Flipping signs doesn't change the sum of squares
+    variances = ((data**2).sum(axis=0) - n * means**2) / (n - 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return means / np.sqrt(variances / n)
+
+
+def max_cluster_masses(t, threshold):
+    """The largest absolute cluster mass (summed t-values) in every row of `t`."""
+    largest = np.zeros(len(t))
+
+    for sign in (1, -1):
+        signed = sign * t
+
+        # A column of False between the rows, so clusters can't continue in the next row
+        above = np.zeros((len(t), t.shape[1] + 1), dtype=bool)
+        above[:, :-1] = signed > threshold
+        above = above.ravel()
+
+        starts = above & ~np.concatenate(([False], above[:-1]))
+        if not starts.any():
+            continue
+
+        # Number the clusters and sum the t-values within each of them
+        clusters = np.cumsum(starts) * above
+        masses = np.bincount(
+            clusters, weights=np.pad(signed, ((0, 0), (0, 1))).ravel() * above
+        )[1:]
+        np.maximum.at(largest, np.flatnonzero(starts) // (t.shape[1] + 1), masses)
+
+    return largest
+
+
+def null_distribution(data, threshold, n_permutations, seed):
+    """Max cluster masses of `n_permutations` random sign flips, runs in a worker."""
+    rng = np.random.default_rng(seed)
+    flips = rng.choice((-1.0, 1.0), (n_permutations, len(data)))
+
+    return max_cluster_masses(t_values(flips, data), threshold)
+
+
+def cluster_test(
+    data, n_permutations=PERMUTATIONS, times=None, max_workers=None, seed=0
+):
+    """
+    Tests `data` (participants, samples) against 0 with a cluster-based permutation
+    test, flipping the sign of whole participants. Participants with missing samples
+    are left out. Returns the t-values and a DataFrame with one row per cluster.
+    """
+    data = np.asarray(data, dtype=float)
+    data = data[~np.isnan(data).any(axis=1)]
+    if times is None:
+        times = epoch_times()
+
+    threshold = stats.t.ppf(1 - CLUSTER_ALPHA / 2, len(data) - 1)
+    t = t_values(np.ones((1, len(data))), data)[0]
+
+    chunks = [
+        min(PERMUTATIONS_PER_CHUNK, n_permutations - start)
+        for start in range(0, n_permutations, PERMUTATIONS_PER_CHUNK)
+    ]
+    seeds = np.random.SeedSequence(seed).generate_state(len(chunks)).tolist()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        null = np.concatenate(
+            list(
+                pool.map(
+                    null_distribution,
+                    [data] * len(chunks),
+                    [threshold] * len(chunks),
+                    chunks,
+                    seeds,
+                )
+            )
+        )
+
+    clusters = []
+    for sign in (1, -1):
+        for start, end in zip(*runs(sign * t > threshold)):
+            mass = t[start:end].sum()
+            clusters.append(
+                {
+                    "start_in_ms": times[start],
+                    "end_in_ms": times[end - 1] + SAMPLE_INTERVAL,
+                    "mass": mass,
+                    "p": (np.sum(null >= abs(mass)) + 1) / (len(null) + 1),
+                }
+            )
+
+    return t, pd.DataFrame(
+        clusters, columns=["start_in_ms", "end_in_ms", "mass", "p"]
+    ).sort_values("start_in_ms", ignore_index=True)
+
+
+def main():
+    # Only needed here, so worker processes don't have to import psychopy
+    from set_up import get_monitor_and_dir
+
+    parser = argparse.ArgumentParser(description="Gaze bias after the capture cue.")
+    parser.add_argument("--reference", choices=REFERENCES, default="capture_cue")
+    parser.add_argument("--permutations", type=int, default=PERMUTATIONS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="save the group time courses to this .csv")
+    arguments = parser.parse_args()
+
+    monitor, directory = get_monitor_and_dir(False)
+    pixels_per_degree = (0.5 * monitor["resolution"][0]) / degrees(
+        atan2(0.5 * monitor["width"], monitor["distance"])
+    )
+
+    participants, time_courses, counts, excluded = build_time_courses(
+        directory,
+        read_participants(directory),
+        monitor["resolution"],
+        pixels_per_degree,
+        arguments.reference,
+        arguments.workers,
+    )
+    print(f"Gaze bias of {len(participants)} participants.")
+
+    times = epoch_times()
+    for index, condition in enumerate(CONDITIONS):
+        _, clusters = cluster_test(
+            time_courses[:, index],
+            arguments.permutations,
+            times,
+            arguments.workers,
+        )
+        print(
+            f"\n{', '.join(condition)}: {counts[:, index].sum()} epochs, "
+            f"{excluded[:, index].sum()} excluded (fixation broken)"
+        )
+        print(clusters.to_string(index=False) if len(clusters) else "  no clusters")
+
+    if arguments.output:
+        pd.DataFrame(
+            {
+                "time_in_ms": np.tile(times, len(CONDITIONS)),
+                "probe_form": np.repeat([c[0] for c in CONDITIONS], len(times)),
+                "cue_form": np.repeat([c[1] for c in CONDITIONS], len(times)),
+                "congruency": np.repeat([c[2] for c in CONDITIONS], len(times)),
+                "towardness": np.nanmean(time_courses, axis=0).ravel(),
+                "sem": (
+                    np.nanstd(time_courses, axis=0, ddof=1)
+                    / np.sqrt((~np.isnan(time_courses)).sum(axis=0))
+                ).ravel(),
+            }
+        ).to_csv(arguments.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+This file contains the functions necessary for
+doing work while the experiment waits for the participant (idle time).
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Jobs are queued with `idle_jobs.add` and run in small slices by `wait_for_key`
+(response.py), so the break and instruction screens keep reacting to key presses.
+A job is either a function (run in one go) or a generator, which is resumed once
+per slice and should yield after every small piece of work.
+
+made by Anna van Harmelen, 2024
+"""
+
+from collections import deque
+from inspect import isgenerator
+from time import perf_counter
+
+SLICE_DURATION = 0.01  # in seconds, at most this long between checking the keyboard
+
+
+class IdleJobs:
+    def __init__(self):
+        self.queue = deque()
+
+    def add(self, job):
+        self.queue.append(job)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def run(self, duration=SLICE_DURATION):
+        """Runs queued jobs until `duration` has passed or nothing is left to do."""
+        start = perf_counter()
+
+        while self.queue and perf_counter() - start < duration:
+            job = self.queue[0]
+
+            if isgenerator(job):
+                try:
+                    next(job)
+                    continue
+                except StopIteration:
+                    pass
+            else:
+                job()
+
+            self.queue.popleft()
+
+    def run_all(self):
+        while self.queue:
+            self.run()
+
+
+idle_jobs = IdleJobs()
@@ -10,11 +10,13 @@ PsychoPyCustomDisplay -- inherited from pylink.EyeLinkCustomDisplay. Defines how
  should be handled by psychopy.
 """
 
-import array
+import collections
 import string
+import time
 import warnings
 
-import PIL
+import numpy as np
+import PIL.Image
 
 import pylink
 
@@ -37,7 +39,7 @@ class PsychoPyCustomDisplay(pylink.EyeLinkCustomDisplay):
     record_abort_hide -- Not implimented.
     setup_image_display -- Shows mouse when camera images are visible.
     image_title -- Updates title text.
-    draw_image_line -- Draws image from buffer.
+    draw_image_line -- Draws image from buffer, with the camera frame rate below it.
     set_image_palette -- Defines image colors.
     exit_image_display -- Hides mouse when camera images are no longer visible.
     clear_cal_display -- Clears calibration targets.
@@ -46,8 +48,8 @@ class PsychoPyCustomDisplay(pylink.EyeLinkCustomDisplay):
     play_beep -- Provides audio feedback.
     get_input_key -- Handles key events.
     alert_printf -- Prints warnings, but doesn't kill session.
-    draw_line -- Draws crosshair lines.
-    draw_lozenge -- Draws ovals on image.
+    draw_line -- Draws crosshair lines, reusing cached Line stimuli.
+    draw_lozenge -- Draws ovals on image, reusing cached Circle stimuli.
     get_mouse_state -- Gets mouse position.
     """
     def __init__(self, window, tracker):
@@ -57,8 +59,12 @@ class PsychoPyCustomDisplay(pylink.EyeLinkCustomDisplay):
         self.window_adj = [i / 2 for i in self.window.size]
         self.tracker = tracker
 
-        self.pal = []
-        self.image_buffer = array.array('I')
+        # Palette as an (n, 3) array of RGB values, camera image as a (height, width, 3) array
+        self.pal = np.zeros((1, 3), dtype=np.uint8)
+        self.image_buffer = None
+        self.image_stim = None
+        self.frame_times = collections.deque(maxlen=30)
+        self.camera_fps = 0.0
         
         if all(i >= 0.5 for i in self.window.color):
             self.text_color = (-1, -1, -1)
@@ -112,10 +118,26 @@ class PsychoPyCustomDisplay(pylink.EyeLinkCustomDisplay):
 
         self.mouse = psychopy.event.Mouse(visible=False)
 
+        # Mouse positions only have to be converted if the window doesn't use pixels
+        self.mouse_needs_conversion = self.window.units != 'pix'
+
+        # Crosshair and lozenge stimuli are made once and reused every camera frame,
+        # the counters say how many of them have been used in the current frame
+        self.line_stims = []
+        self.line_colors = []
+        self.lines_used = 0
+        self.lozenge_stims = []
+        self.lozenge_colors = []
+        self.lozenges_used = 0
+
         self.image_title_object = psychopy.visual.TextStim(
             self.window, text='', pos=(0, -200), height=20, units='pix', color=self.text_color
         )
 
+        self.fps_object = psychopy.visual.TextStim(
+            self.window, text='', pos=(0, -230), height=14, units='pix', color=self.text_color
+        )
+
         self.cal_target_outer = psychopy.visual.Circle(
             self.window, units='pix', radius=18, lineColor='black', fillColor='white'
         )
@@ -139,6 +161,7 @@ class PsychoPyCustomDisplay(pylink.EyeLinkCustomDisplay):
     def setup_image_display(self, width, height):
         """Shows mouse when camera images are visible."""
         psychopy.event.Mouse(visible=True)
+        self.frame_times.clear()
         self.window.flip()
 
     def image_title(self, title):
@@ -147,32 +170,48 @@ class PsychoPyCustomDisplay(pylink.EyeLinkCustomDisplay):
 
     def draw_image_line(self, width, line, totlines, buff):
         """Draws image from buffer."""
-        for i in buff:
-            if i >= len(self.pal):
-                self.image_buffer.append(self.pal[-1])
-            else:
-                self.image_buffer.append(self.pal[i])
+        if self.image_buffer is None or self.image_buffer.shape[:2] != (totlines, width):
+            self.image_buffer = np.zeros((totlines, width, 3), dtype=np.uint8)
+
+        # Palette indices outside of the palette get its last colour
+        indices = np.minimum(np.asarray(buff[:width], dtype=np.intp), len(self.pal) - 1)
+        np.take(self.pal, indices, axis=0, out=self.image_buffer[line - 1, :len(indices)])
 
         if line == totlines:
-            bufferv = self.image_buffer.tostring()
-            image = PIL.Image.frombytes("RGBX", (width, totlines), bufferv)
+            image = PIL.Image.fromarray(self.image_buffer, 'RGB')
+
+            # Only the texture of the same ImageStim is updated every frame
+            if self.image_stim is None or tuple(self.image_stim.size) != (width, totlines):
+                self.image_stim = psychopy.visual.ImageStim(
+                    self.window, image=image, units='pix', size=(width, totlines))
+            else:
+                self.image_stim.image = image
 
-            psychopy_image = psychopy.visual.ImageStim(self.window, image=image)
+            self.update_fps()
 
-            psychopy_image.draw()
+            self.image_stim.draw()
+            self.lines_used = self.lozenges_used = 0
             self.draw_cross_hair()
             self.image_title_object.draw()
+            self.fps_object.draw()
             self.window.flip()
 
-            self.image_buffer = array.array('I')
+    def update_fps(self):
+        """Updates the camera frame rate, averaged over the last 30 frames."""
+        self.frame_times.append(time.perf_counter())
+
+        if len(self.frame_times) > 1:
+            self.camera_fps = (len(self.frame_times) - 1) / (
+                self.frame_times[-1] - self.frame_times[0])
+
+            # Changing text is slow, so only do it when the number changes
+            fps_text = '%.0f fps' % self.camera_fps
+            if self.fps_object.text != fps_text:
+                self.fps_object.text = fps_text
 
     def set_image_palette(self, r, g, b):
         """Defines image colors."""
-        self.pal = []
-
-        # Code taken from pylink docs and altered
-        for r_, g_, b_ in zip(r, g, b):
-            self.pal.append((b_ << 16) | g_ << 8 | r_)
+        self.pal = np.column_stack((r, g, b)).astype(np.uint8)
 
     def exit_image_display(self):
         """Hides mouse when camera images are no longer visible."""
@@ -230,39 +269,60 @@ class PsychoPyCustomDisplay(pylink.EyeLinkCustomDisplay):
             x1, x2 = x1 + 767, x2 + 767
             y1, y2 = y1 + 639, y2 + 639
 
-        if colorindex in self.colors:
-            color = self.colors[colorindex]
-        else:
-            color = (0, 0, 0)
+        color = self.colors.get(colorindex, (0, 0, 0))
 
         # Adjustments are made so that center is (0,0) and y is flipped
         x1, x2 = x1 - 96, x2 - 96
         y1, y2 = (160 - y1 - 80), (160 - y2 - 80)
 
-        psychopy.visual.Line(
-            self.window, units='pix', lineColor=color, start=(x1, y1), end=(x2, y2)
-        ).draw()
+        if self.lines_used == len(self.line_stims):
+            self.line_stims.append(psychopy.visual.Line(
+                self.window, units='pix', lineColor=color, start=(x1, y1), end=(x2, y2)))
+            self.line_colors.append(color)
+        else:
+            line = self.line_stims[self.lines_used]
+            line.start = (x1, y1)
+            line.end = (x2, y2)
+
+            # Setting a colour is slow, so only do it if it changed
+            if self.line_colors[self.lines_used] != color:
+                line.lineColor = color
+                self.line_colors[self.lines_used] = color
+
+        self.line_stims[self.lines_used].draw()
+        self.lines_used += 1
 
     def draw_lozenge(self, x, y, width, height, colorindex):
         """Draws ovals on image."""
-        if colorindex in self.colors:
-            color = self.colors[colorindex]
-        else:
-            color = (0, 0, 0)
+        color = self.colors.get(colorindex, (0, 0, 0))
 
         # Adjustments are made so that center is (0,0) and y is flipped
         x = round(x + (0.5 * width)) - 96
         y = round((160 - y) - (0.5 * height)) - 80
 
-        psychopy.visual.Circle(
-            self.window, units='pix', lineColor=color, pos=(x, y), size=(width, height)).draw()
+        if self.lozenges_used == len(self.lozenge_stims):
+            self.lozenge_stims.append(psychopy.visual.Circle(
+                self.window, units='pix', lineColor=color, pos=(x, y), size=(width, height)))
+            self.lozenge_colors.append(color)
+        else:
+            lozenge = self.lozenge_stims[self.lozenges_used]
+            lozenge.pos = (x, y)
+            lozenge.size = (width, height)
+
+            if self.lozenge_colors[self.lozenges_used] != color:
+                lozenge.lineColor = color
+                self.lozenge_colors[self.lozenges_used] = color
+
+        self.lozenge_stims[self.lozenges_used].draw()
+        self.lozenges_used += 1
 
     def get_mouse_state(self):
         """Gets mouse position."""
         mouse_pos = self.mouse.getPos()
-        mouse_pos = psychopy.tools.monitorunittools.convertToPix(
-            mouse_pos, [0, 0], self.window.units, self.window
-        )
+        if self.mouse_needs_conversion:
+            mouse_pos = psychopy.tools.monitorunittools.convertToPix(
+                mouse_pos, [0, 0], self.window.units, self.window
+            )
         # Adjustments are made so that center is (0,0) and y is flipped
         mouse_pos = (mouse_pos[0] + 96, (160 - mouse_pos[1]) - 80)
         mouse_click = 1 if self.mouse.getPressed()[0] else 0
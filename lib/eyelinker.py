@@ -7,11 +7,15 @@ Rewrite by Baiwei Liu (lbwair@icloud.com)
 import os
 import sys
 import time
+from contextlib import redirect_stdout
 import pygame
 from pygame.locals import *
 
 import pylink as pl
 from .PsychoPyCustomDisplay import PsychoPyCustomDisplay
+from .syntheticgaze import SyntheticGaze
+from .gazebuffer import GazeReader, SAMPLE_DTYPE, EVENT_DTYPE
+import numpy as np
 from math import sin, cos, pi, atan, sqrt, radians, hypot
 
 import psychopy.event
@@ -58,7 +62,7 @@ def _get_connection_failure_response():
     return psychopy.event.waitKeys(keyList=['r', 'q', 'd'])[0]
 
 
-def EyeLinker(window, filename, eye, text_color=None):
+def EyeLinker(window, filename, eye, text_color=None, mock_settings=None):
     """A factory function that either returns a ConnectedEyeLinker or MockEyeLinker.
     Parameters:
     window -- A psychopy.visual.Window object
@@ -66,7 +70,11 @@ def EyeLinker(window, filename, eye, text_color=None):
     eye -- Which eye(s) to track, either "LEFT", "RIGHT" or "BOTH"
     text_color -- Defined using window color to black or white, but can be overwritten by
      providing a (r,g,b) tuple with values between -1 and 1
+    mock_settings -- keyword arguments for the MockEyeLinker, used in debug mode
     """
+    if mock_settings is None:
+        mock_settings = {}
+
     connected, e = _try_connection()
 
     if connected:
@@ -91,19 +99,13 @@ def EyeLinker(window, filename, eye, text_color=None):
     elif response == 'd':
         window.flip()
         print('Continuing with mock eyetracking. Eyetracking data will not be saved!')
-        return MockEyeLinker(window, filename, eye, text_color=None)
+        return MockEyeLinker(window, filename, eye, text_color=None, **mock_settings)
 
 class ConnectedEyeLinker:
     """Returned if a connection is possible."""
     def __init__(self, window, filename, eye, text_color=None):
         """See Eyelinker factory function for parameter info."""
-        if len(filename) > 12:
-            raise ValueError(
-                'EDF filename must be at most 12 characters long including the extension.')
-
-        if filename[-4:] != '.edf':
-            raise ValueError(
-                'Please include the .edf extension in the filename.')
+        _check_edf_filename(filename)
 
         if eye not in ('LEFT', 'RIGHT', 'BOTH'):
             raise ValueError('eye must be set to LEFT, RIGHT, or BOTH.')
@@ -116,6 +118,7 @@ class ConnectedEyeLinker:
         self.tracker = pl.EyeLink()
         self.genv = PsychoPyCustomDisplay(self.window, self.tracker)
         self.mock = False
+        self.gaze_reader = None
 
         if text_color is None:
             if all(i >= 0.5 for i in self.window.color):
@@ -226,8 +229,16 @@ class ConnectedEyeLinker:
         self.send_command(
             'validation_area_proportion %f %f' % settings['validation_area_proportion'])
 
-    def open_edf(self):
-        """Opens the edf file, must be called before tracker is initialized."""
+    def open_edf(self, filename=None):
+        """Opens the edf file, must be called before tracker is initialized.
+        Parameters:
+        filename -- optionally, a new edf filename (max 12 characters with extension), to
+         continue the recording in a new file after close_edf
+        """
+        if filename is not None:
+            _check_edf_filename(filename)
+            self.edf_filename = filename
+
         self.tracker.openDataFile(self.edf_filename)
         self.edf_open = True
 
@@ -236,23 +247,35 @@ class ConnectedEyeLinker:
         self.tracker.closeDataFile()
         self.edf_open = False
 
-    def transfer_edf(self, new_filename=None):
+    def transfer_edf(self, new_filename=None, edf_filename=None, quiet=True):
         """Transfers the edf file to the computer running psychopy.
+        Returns the size of the transferred file in bytes, as reported by the tracker.
         Parameters:
         new_filename -- optionally, a new filename for the edf file with no character restriciton.
+        edf_filename -- optionally, the (closed) edf file on the tracker to transfer, instead of
+         the current one
+        quiet -- whether to silence the printing of pylink during the transfer, by replacing
+         sys.stdout. This silences every thread, so don't use it for background transfers
         """
+        if not edf_filename:
+            edf_filename = self.edf_filename
+
         if not new_filename:
-            new_filename = self.edf_filename
+            new_filename = edf_filename
 
         if new_filename[-4:] != '.edf':
             raise ValueError('Please include the .edf extension in the filename.')
 
-        # Prevents timeouts due to excessive printing
-        sys.stdout = open(os.devnull, "w")
-        self.tracker.receiveDataFile(self.edf_filename, new_filename)
-        sys.stdout = sys.__stdout__
+        if quiet:
+            # Prevents timeouts due to excessive printing
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                size = self.tracker.receiveDataFile(edf_filename, new_filename)
+        else:
+            size = self.tracker.receiveDataFile(edf_filename, new_filename)
         print(new_filename + ' has been transferred successfully.')
 
+        return size
+
     def setup_tracker(self):
         """Enters setup menu on eyelink computer."""
         self.window.flip()
@@ -354,14 +377,75 @@ class ConnectedEyeLinker:
         time.sleep(.1)  # required
         self.tracker.stopRecording()
 
+    def start_gaze_buffer(self, capacity_ms=10000):
+        """Starts a background thread that keeps the last `capacity_ms` of samples and the
+        most recent events in memory, see lib/gazebuffer.py. Read them with
+        `tracker.gaze_reader.last_ms(ms)` and `tracker.gaze_reader.events_since(time)`.
+        Don't use check_sacc or check_fix while it runs, they read from the same link queue.
+        """
+        if self.gaze_reader is None:
+            self.gaze_reader = GazeReader(self._drain_link, capacity_ms)
+            self.gaze_reader.start()
+
+        return self.gaze_reader
+
+    def stop_gaze_buffer(self):
+        """Stops the background reader started by start_gaze_buffer."""
+        if self.gaze_reader is not None:
+            self.gaze_reader.stop()
+            self.gaze_reader = None
+
+    def _drain_link(self):
+        """Reads all samples and events currently waiting in the link queue."""
+        samples, events = [], []
+
+        while True:
+            data_type = self.tracker.getNextData()
+            if not data_type:
+                break
+
+            data = self.tracker.getFloatData()
+            if data is None:
+                continue
+
+            if data_type == pl.SAMPLE_TYPE:
+                if self.eye == 'LEFT' and data.isLeftSample():
+                    eye_data = data.getLeftEye()
+                elif self.eye != 'LEFT' and data.isRightSample():
+                    eye_data = data.getRightEye()
+                else:
+                    continue
+
+                x, y = eye_data.getGaze()
+                valid = x != pl.MISSING_DATA and y != pl.MISSING_DATA
+                samples.append((data.getTime(), x, y, eye_data.getPupilSize(), valid))
+
+            elif data_type == pl.ENDSACC:
+                events.append(('saccade', data.getStartTime(), data.getEndTime(),
+                               *data.getStartGaze(), *data.getEndGaze()))
+            elif data_type == pl.ENDFIX:
+                events.append(('fixation', data.getStartTime(), data.getEndTime(),
+                               *data.getAverageGaze(), *data.getAverageGaze()))
+            elif data_type == pl.ENDBLINK:
+                events.append(('blink', data.getStartTime(), data.getEndTime(),
+                               np.nan, np.nan, np.nan, np.nan))
+
+        return samples, events
+
     @property
     def gaze_data(self):
         """A property with the most recent gaze sample.
         Contains a tuple with gaze data. If both eyes are being tracked the tuple contains two
          tuples. Each tuple of gaze data contains an x and y value in pixels. Can be accessed
          with `tracker.gaze_data`
+        Reads from the gaze buffer instead of the link if start_gaze_buffer was called.
         See eyelinker_example.py for an example.
         """
+        if self.gaze_reader is not None and self.eye != 'BOTH':
+            sample = self.gaze_reader.samples.newest()
+            if sample is not None:
+                return (sample['x'], sample['y'])
+
         sample = self.tracker.getNewestSample()
 
         if self.eye == 'LEFT':
@@ -378,8 +462,14 @@ class ConnectedEyeLinker:
         a single value. Pupil sizes units can be controlled with `send_tracking_settings`.
          Eyelinker returns area by defult. See pylink docs about `setPupilSizeDiameter` for more
          info.
+        Reads from the gaze buffer instead of the link if start_gaze_buffer was called.
         See eyelinker_example.py for an example.
         """
+        if self.gaze_reader is not None and self.eye != 'BOTH':
+            sample = self.gaze_reader.samples.newest()
+            if sample is not None:
+                return sample['pupil']
+
         sample = self.tracker.getNewestSample()
 
         if self.eye == 'LEFT':
@@ -389,6 +479,10 @@ class ConnectedEyeLinker:
         else:
             return (sample.getLeftEye().getPupilSize(), sample.getRightEye().getPupilSize())
 
+    def tracker_time(self):
+        """The current tracker time in ms, with sub-millisecond precision."""
+        return self.tracker.trackerTimeUsec() / 1000
+
     def set_offline_mode(self):
         """Sets tracker to offline mode."""
         self.tracker.setOfflineMode()
@@ -461,6 +555,17 @@ class ConnectedEyeLinker:
         self.stop_recording()
         print('Basic functionality tests passed...')
 
+def _check_edf_filename(filename):
+    """Raises a ValueError if the tracker can't use filename for an edf file."""
+    if len(filename) > 12:
+        raise ValueError(
+            'EDF filename must be at most 12 characters long including the extension.')
+
+    if filename[-4:] != '.edf':
+        raise ValueError(
+            'Please include the .edf extension in the filename.')
+
+
 def topLeftToCenter(pointXY, screenXY, flipY=False):
     """
     Takes a coordinate given in topLeft reference frame and transforms it
@@ -580,7 +685,7 @@ def check_fix(start_loc, fix_loc, acceptableDev, Dis_for_sacc, scnSize, startime
         gazePos = topLeftToCenter(gazePos,scnSize)
         Value =[fixAcquired, fix4Target, gazePos, gazeDev, ref_time]
     else:
-        Value = [False, False, None, None, None, None]
+        Value = [False, False, None, None, None]
     return Value
 
 def checkKeyEvent(KEYS_ALLOWED,TERMINATE_UPON_RESP,startime):
@@ -629,21 +734,35 @@ def _mock_func(*args, **kwargs):
 
 
 class MockEyeLinker:
-    """Returned if a connection could not be made, useful for debugging away from the trackers."""
-    def __init__(self, window, filename, eye, text_color=None):
+    """Returned if a connection could not be made, useful for debugging away from the trackers.
+    Instead of real eyetracking data, it generates synthetic 1000 Hz gaze and pupil data (see
+     lib/syntheticgaze.py) and saves it, together with all messages, to an ASC-like file.
+    Parameters:
+    cue_side -- optionally, a function that turns a message into the side ('left' or 'right')
+     that the synthetic gaze should be biased towards, or None if the message is not a cue
+    gaze_settings -- keyword arguments for SyntheticGaze, e.g. gaze_bias or seed
+    """
+    def __init__(self, window, filename, eye, text_color=None, cue_side=None,
+                 resolution=None, **gaze_settings):
         self.window = window
         self.edf_filename = filename
         self.edf_open = False
         self.eye = eye
-        self.resolution = tuple(window.size)
+        self.resolution = tuple(window.size) if resolution is None else tuple(resolution)
         self.tracker = None
         self.genv = None
-        self.gaze_data = (None, None)
-        self.pupil_size = (None, None)
         self.mock = True
+        self.cue_side = cue_side
+        self.synthetic_gaze = SyntheticGaze(self.resolution, **gaze_settings)
+        self.gaze_reader = None
+        self._sample_cursor = 0
+
+        # (start, end) tracker time of every closed edf file, to write them separately
+        self._segment_start = 0
+        self._segments = {}
 
         if text_color is None:
-            if all(i >= 0.5 for i in self.window.color):
+            if window is not None and all(i >= 0.5 for i in self.window.color):
                 self.text_color = (-1, -1, -1)
             else:
                 self.text_color = (1, 1, 1)
@@ -658,3 +777,104 @@ class MockEyeLinker:
             return _mock_func
 
         self.record = record
+
+        # These work on the synthetic data instead of doing nothing
+        self.start_recording = self.synthetic_gaze.start
+        self.stop_recording = self.synthetic_gaze.stop
+        self.send_message = self._send_message
+        self.transfer_edf = self._transfer_edf
+        self.end_exp = self._end_exp
+        self.open_edf = self._open_edf
+        self.close_edf = self._close_edf
+        self.tracker_time = self.synthetic_gaze.tracker_time
+        self.start_gaze_buffer = self._start_gaze_buffer
+        self.stop_gaze_buffer = self._stop_gaze_buffer
+
+    @property
+    def gaze_data(self):
+        """The most recent synthetic gaze sample, see ConnectedEyeLinker.gaze_data."""
+        _, x, y, _ = self.synthetic_gaze.newest_sample()
+
+        if self.eye == 'BOTH':
+            return ((x, y), (x, y))
+        return (x, y)
+
+    @property
+    def pupil_size(self):
+        """The most recent synthetic pupil size, see ConnectedEyeLinker.pupil_size."""
+        _, _, _, pupil = self.synthetic_gaze.newest_sample()
+
+        if self.eye == 'BOTH':
+            return (pupil, pupil)
+        return pupil
+
+    def _start_gaze_buffer(self, capacity_ms=10000):
+        """See ConnectedEyeLinker.start_gaze_buffer, reads the synthetic samples instead."""
+        if self.gaze_reader is None:
+            self._sample_cursor = self.synthetic_gaze.size
+            self.gaze_reader = GazeReader(self._drain_synthetic, capacity_ms)
+            self.gaze_reader.start()
+
+        return self.gaze_reader
+
+    def _stop_gaze_buffer(self):
+        if self.gaze_reader is not None:
+            self.gaze_reader.stop()
+            self.gaze_reader = None
+
+    def _drain_synthetic(self):
+        """Reads all synthetic samples recorded since the last call (it has no events)."""
+        recorded, self._sample_cursor = self.synthetic_gaze.new_samples(self._sample_cursor)
+        samples = np.empty(len(recorded), dtype=SAMPLE_DTYPE)
+
+        for field in ('time', 'x', 'y', 'pupil'):
+            samples[field] = recorded[field]
+        samples['valid'] = ~np.isnan(recorded['x'])
+
+        return samples, np.empty(0, dtype=EVENT_DTYPE)
+
+    def _send_message(self, msg):
+        """Saves the message with a timestamp, and starts a gaze bias if it is a cue."""
+        self.synthetic_gaze.message(msg)
+
+        if self.cue_side is not None:
+            side = self.cue_side(msg)
+            if side is not None:
+                self.synthetic_gaze.cue(side)
+
+    def _open_edf(self, filename=None):
+        if filename is not None:
+            _check_edf_filename(filename)
+            self.edf_filename = filename
+
+        self._segment_start = self.synthetic_gaze.tracker_time()
+        self.edf_open = True
+
+    def _close_edf(self):
+        self._segments[self.edf_filename] = (
+            self._segment_start, self.synthetic_gaze.tracker_time())
+        self.edf_open = False
+
+    def _transfer_edf(self, new_filename=None, edf_filename=None, quiet=True):
+        """Writes the synthetic recording to an .asc file instead of transferring an .edf file.
+        Only the part recorded while `edf_filename` was open is written, if it was closed.
+        Returns the size of the written file in bytes.
+        """
+        if not edf_filename:
+            edf_filename = self.edf_filename
+
+        if not new_filename:
+            new_filename = edf_filename
+
+        if new_filename[-4:] != '.edf':
+            raise ValueError('Please include the .edf extension in the filename.')
+
+        start, end = self._segments.get(edf_filename, (None, None))
+        self.synthetic_gaze.write_asc(new_filename[:-4] + '.asc', self.eye, start, end)
+        print(new_filename[:-4] + '.asc has been written (synthetic data).')
+
+        return os.path.getsize(new_filename[:-4] + '.asc')
+
+    def _end_exp(self):
+        self.stop_recording()
+        self.transfer_edf()
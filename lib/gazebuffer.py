@@ -0,0 +1,139 @@
+"""A background reader that keeps the most recent gaze samples and events in memory.
+
+The reader thread drains all samples and events from the link (or from the MockEyeLinker's
+synthetic data) into fixed-size NumPy ring buffers. The experiment thread can then read the
+last N milliseconds at any time, without a lock and without copying.
+
+Each buffer is stored twice in a row (a 'mirrored' ring buffer), so the newest `capacity`
+rows are always one contiguous slice of the underlying array. The single writer first writes
+both copies and only then increases `count`, so a reader that reads `count` once always sees
+complete rows. Besides the `capacity` rows that can be read, `margin` more rows are kept, so
+the oldest row of a view isn't overwritten by the very next write: a view of `n` rows stays
+valid until the writer has written `capacity + margin - n` new rows, and at least `margin`
+(default 500, half a second of samples at 1000 Hz). Copy a view you want to keep longer.
+
+Classes:
+RingBuffer -- a mirrored, single-writer ring buffer of a structured dtype.
+GazeReader -- a thread that fills a sample and an event RingBuffer.
+"""
+import threading
+import time
+
+import numpy as np
+
+READ_MARGIN = 500  # rows kept beyond the capacity, see above
+
+SAMPLE_DTYPE = np.dtype([
+    ('time', np.int64),  # tracker time in ms
+    ('x', np.float32),  # gaze in screen pixels, (0,0) is top left
+    ('y', np.float32),
+    ('pupil', np.float32),
+    ('valid', np.bool_),  # False during blinks or track loss
+])
+
+EVENT_DTYPE = np.dtype([
+    ('type', 'U8'),  # 'saccade', 'fixation' or 'blink'
+    ('start_time', np.int64),
+    ('end_time', np.int64),
+    ('start_x', np.float32),
+    ('start_y', np.float32),
+    ('end_x', np.float32),
+    ('end_y', np.float32),
+])
+
+
+class RingBuffer:
+    """A fixed-size, single-writer ring buffer of rows with a structured dtype.
+    Parameters:
+    dtype -- a structured numpy dtype, with a sorted 'time' or 'end_time' field
+    capacity -- maximum number of rows read at once
+    margin -- number of rows kept beyond the capacity, written while a reader uses a view
+    """
+    def __init__(self, dtype, capacity, margin=READ_MARGIN):
+        self.capacity = capacity
+        self.size = capacity + margin
+        self.data = np.zeros(2 * self.size, dtype=dtype)
+        self.count = 0  # total number of rows ever written
+        self.time_field = 'time' if 'time' in dtype.names else 'end_time'
+
+    def write(self, rows):
+        """Appends rows (a structured array or list of tuples). Only call from one thread."""
+        rows = np.asarray(rows, dtype=self.data.dtype)[-self.size:]
+        indices = (self.count + np.arange(len(rows))) % self.size
+
+        self.data[indices] = rows
+        self.data[indices + self.size] = rows
+        self.count += len(rows)
+
+    def last_n(self, n):
+        """A view of the newest `n` rows (or fewer, if fewer were written)."""
+        count = self.count
+        n = min(n, count, self.capacity)
+        end = (count - 1) % self.size + self.size + 1
+
+        return self.data[end - n:end]
+
+    def since(self, start_time):
+        """A view of all kept rows with a time at or after `start_time`."""
+        window = self.last_n(self.capacity)
+        first = np.searchsorted(window[self.time_field], start_time)
+
+        return window[first:]
+
+    def last_ms(self, ms):
+        """A view of all rows of the last `ms` milliseconds (relative to the newest row)."""
+        window = self.last_n(self.capacity)
+        if not len(window):
+            return window
+
+        first = np.searchsorted(window[self.time_field], window[self.time_field][-1] - ms)
+
+        return window[first:]
+
+    def newest(self):
+        """The newest row, or None if nothing was written yet."""
+        window = self.last_n(1)
+        return window[0] if len(window) else None
+
+
+class GazeReader(threading.Thread):
+    """Continuously moves new samples and events from `drain` into ring buffers.
+    Parameters:
+    drain -- a function returning (samples, events) that arrived since the last call, as
+     lists of tuples or structured arrays with SAMPLE_DTYPE and EVENT_DTYPE
+    capacity_ms -- how many ms of samples to keep (at 1000 Hz)
+    poll_interval -- time to sleep when no new data is available, in seconds
+    """
+    def __init__(self, drain, capacity_ms=10000, poll_interval=0.0005):
+        super().__init__(daemon=True)
+        self.drain = drain
+        self.poll_interval = poll_interval
+        self.samples = RingBuffer(SAMPLE_DTYPE, capacity_ms)
+        self.events = RingBuffer(EVENT_DTYPE, 1000)
+        self.running = False
+
+    def run(self):
+        self.running = True
+        while self.running:
+            samples, events = self.drain()
+
+            if len(samples):
+                self.samples.write(samples)
+            if len(events):
+                self.events.write(events)
+
+            if not len(samples) and not len(events):
+                time.sleep(self.poll_interval)
+
+    def stop(self):
+        self.running = False
+        if self.is_alive():
+            self.join()
+
+    def last_ms(self, ms):
+        """A view of the samples of the last `ms` milliseconds, see RingBuffer.last_ms."""
+        return self.samples.last_ms(ms)
+
+    def events_since(self, start_time):
+        """A view of the events that ended at or after `start_time`."""
+        return self.events.since(start_time)
@@ -0,0 +1,260 @@
+"""Synthetic gaze and pupil data for the MockEyeLinker.
+
+Generates a 1000 Hz stream of gaze samples in EyeLink (top-left) screen coordinates, with
+fixational drift, microsaccades, blinks and an optional gaze bias towards a cued side.
+Samples are generated lazily up to the current time, so no thread is needed.
+
+Classes:
+SyntheticGaze -- keeps the synthetic recording and writes it to an ASC-like file.
+"""
+import threading
+import time
+
+import numpy as np
+from scipy.signal import lfilter
+
+SAMPLE_RATE = 1000  # in Hz, one sample per ms of tracker time
+
+RECORDING_DTYPE = np.dtype([
+    ('time', np.int64),
+    ('x', np.float32),
+    ('y', np.float32),
+    ('pupil', np.float32),
+])
+
+
+class SyntheticGaze:
+    """A synthetic eyetracker recording, driven by the wall clock.
+    Parameters:
+    resolution -- (width, height) of the screen in pixels
+    pixels_per_degree -- used to scale all eye movements
+    gaze_bias -- peak horizontal gaze shift towards the cued side, in degrees
+    bias_latency -- time between cue and onset of the gaze bias, in seconds
+    bias_peak -- time between onset and peak of the gaze bias, in seconds
+    drift_sd -- standard deviation of the fixational drift, in degrees
+    drift_tau -- time constant with which drift returns to the fixation point, in seconds
+    microsaccade_rate -- in microsaccades per second
+    microsaccade_amplitude -- mean amplitude in degrees
+    blink_rate -- in blinks per second
+    noise_sd -- measurement noise in degrees
+    pupil_size -- mean pupil size in arbitrary (area) units
+    seed -- seed of the random number generator
+    """
+    def __init__(self, resolution, pixels_per_degree=46, gaze_bias=0.3,
+                 bias_latency=0.15, bias_peak=0.3, drift_sd=0.15, drift_tau=0.5,
+                 microsaccade_rate=1.5, microsaccade_amplitude=0.3, blink_rate=0.25,
+                 noise_sd=0.02, pupil_size=1200, seed=None):
+        self.resolution = tuple(resolution)
+        self.center = np.array(self.resolution, dtype=float) / 2
+        self.ppd = pixels_per_degree
+        self.gaze_bias = gaze_bias
+        self.bias_latency = bias_latency
+        self.bias_peak = bias_peak
+        self.microsaccade_rate = microsaccade_rate
+        self.microsaccade_amplitude = microsaccade_amplitude
+        self.blink_rate = blink_rate
+        self.noise_sd = noise_sd
+        self.pupil_mean = pupil_size
+        self.rng = np.random.default_rng(seed)
+
+        # AR(1) coefficient and innovation size that give the requested drift sd
+        self.drift_a = np.exp(-1 / (drift_tau * SAMPLE_RATE))
+        self.drift_innovation = drift_sd * np.sqrt(1 - self.drift_a ** 2)
+        self.pupil_a = np.exp(-1 / (2 * SAMPLE_RATE))
+
+        # Microsaccades are spread over 20 ms
+        self.saccade_kernel = np.ones(int(0.02 * SAMPLE_RATE)) / int(0.02 * SAMPLE_RATE)
+
+        self.recording = False
+        self.start_clock = time.perf_counter()
+        self.next_time = 0  # tracker time of the next sample to generate, in ms
+        self.cue_time = None
+        self.cue_direction = 0
+        self.blink_until = -1
+
+        self.drift_state = np.zeros((2, 1))
+        self.saccade_state = np.zeros((2, len(self.saccade_kernel) - 1))
+        self.pupil_state = np.zeros(1)
+
+        # Grows by doubling, the first `size` rows are the recording
+        self.recorded = np.zeros(60 * SAMPLE_RATE, dtype=RECORDING_DTYPE)
+        self.size = 0
+        self.messages = []
+
+        # The gaze buffer's reader thread also generates samples
+        self.lock = threading.Lock()
+
+    def tracker_time(self):
+        """The current tracker time in ms."""
+        return int((time.perf_counter() - self.start_clock) * 1000)
+
+    def start(self):
+        """Starts recording, samples generated while not recording are thrown away."""
+        self.update()
+        self.recording = True
+
+    def stop(self):
+        self.update()
+        self.recording = False
+
+    def message(self, msg):
+        """Saves a message with the current tracker time."""
+        self.update()
+        self.messages.append((self.tracker_time(), msg))
+
+    def cue(self, side):
+        """Starts a gaze bias towards `side` ('left' or 'right')."""
+        self.update()
+        self.cue_time = self.tracker_time()
+        self.cue_direction = {"left": -1, "right": 1}[side]
+
+    def update(self):
+        """Generates all samples up to the current tracker time."""
+        with self.lock:
+            self._update()
+
+    def _update(self):
+        now = self.tracker_time()
+        n = now - self.next_time + 1
+        if n <= 0:
+            return
+
+        # Nothing is saved while not recording, so only keep the state going
+        if not self.recording and n > SAMPLE_RATE:
+            n = SAMPLE_RATE
+
+        t = now - n + 1 + np.arange(n)
+        self.next_time = now + 1
+
+        # Fixational drift with microsaccades, in degrees
+        impulses = np.zeros((2, n))
+        onsets = np.flatnonzero(self.rng.random(n) < self.microsaccade_rate / SAMPLE_RATE)
+        if len(onsets):
+            angles = self.rng.uniform(0, 2 * np.pi, len(onsets))
+            amplitudes = self.rng.gamma(4, self.microsaccade_amplitude / 4, len(onsets))
+            impulses[0, onsets] = amplitudes * np.cos(angles)
+            impulses[1, onsets] = amplitudes * np.sin(angles)
+
+        saccades, self.saccade_state = lfilter(
+            self.saccade_kernel, [1], impulses, axis=1, zi=self.saccade_state)
+        innovations = self.rng.normal(0, self.drift_innovation, (2, n))
+        drift, self.drift_state = lfilter(
+            [1], [1, -self.drift_a], innovations + saccades, axis=1, zi=self.drift_state)
+
+        gaze = drift + self.rng.normal(0, self.noise_sd, (2, n))
+        gaze[0] += self.cue_direction * self.bias(t)
+
+        # Degrees to EyeLink screen coordinates (y points down)
+        x = self.center[0] + gaze[0] * self.ppd
+        y = self.center[1] - gaze[1] * self.ppd
+
+        pupil, self.pupil_state = lfilter(
+            [1], [1, -self.pupil_a], self.rng.normal(0, 2, n), zi=self.pupil_state)
+        pupil = self.pupil_mean + pupil
+
+        # Blinks, during which the tracker loses the eye
+        blinking = t <= self.blink_until
+        onsets = np.flatnonzero(self.rng.random(n) < self.blink_rate / SAMPLE_RATE)
+        for onset in onsets:
+            if t[onset] > self.blink_until:
+                self.blink_until = t[onset] + int(self.rng.uniform(0.1, 0.25) * 1000)
+                blinking |= (t >= t[onset]) & (t <= self.blink_until)
+
+        x[blinking] = np.nan
+        y[blinking] = np.nan
+        pupil[blinking] = 0
+
+        if self.recording:
+            if self.size + n > len(self.recorded):
+                grown = np.zeros(2 * (self.size + n), dtype=RECORDING_DTYPE)
+                grown[:self.size] = self.recorded[:self.size]
+                self.recorded = grown
+
+            rows = self.recorded[self.size:self.size + n]
+            rows['time'], rows['x'], rows['y'], rows['pupil'] = t, x, y, pupil
+            self.size += n
+
+        self.newest = (t[-1], x[-1], y[-1], pupil[-1])
+
+    def bias(self, t):
+        """The gaze bias (in degrees) at tracker times `t`, following the last cue."""
+        if self.cue_time is None or not self.gaze_bias:
+            return np.zeros(len(t))
+
+        since = (t - self.cue_time) / 1000 - self.bias_latency
+        since = np.clip(since, 0, None) / self.bias_peak
+
+        # Gamma-shaped time course that peaks at bias_latency + bias_peak
+        return self.gaze_bias * since * np.exp(1 - since)
+
+    def newest_sample(self):
+        """Returns (time, x, y, pupil) of the newest sample."""
+        self.update()
+        return self.newest
+
+    def samples(self, since=None):
+        """Returns the recorded (time, x, y, pupil) arrays, optionally only from `since` on."""
+        self.update()
+
+        with self.lock:
+            recorded = self.recorded[:self.size]
+
+        if since is not None:
+            recorded = recorded[np.searchsorted(recorded['time'], since):]
+
+        return recorded['time'], recorded['x'], recorded['y'], recorded['pupil']
+
+    def new_samples(self, cursor):
+        """Returns a structured array of the samples recorded after sample number `cursor`,
+        and the cursor to use next time."""
+        self.update()
+
+        with self.lock:
+            return self.recorded[cursor:self.size], self.size
+
+    def write_asc(self, path, eye='RIGHT', start_time=None, end_time=None):
+        """Writes the recording and all messages to an ASC-like file.
+        Parameters:
+        start_time, end_time -- optionally, only write this part (in tracker time) of the recording
+        """
+        t, x, y, pupil = self.samples(start_time)
+        messages = [m for m in self.messages if start_time is None or m[0] >= start_time]
+
+        if end_time is not None:
+            last = np.searchsorted(t, end_time, side='right')
+            t, x, y, pupil = t[:last], x[:last], y[:last], pupil[:last]
+            messages = [m for m in messages if m[0] <= end_time]
+
+        eye_letter = eye[0]
+
+        lines = [
+            '** CONVERTED FROM SYNTHETIC GAZE (MockEyeLinker)',
+            '** DATE: %s' % time.strftime('%a %b %d %H:%M:%S %Y'),
+            '',
+        ]
+        if len(t):
+            lines.append('MSG\t%d DISPLAY_COORDS 0 0 %d %d' % (t[0], *self.resolution))
+            lines.append('START\t%d \t%s\tSAMPLES\tEVENTS' % (t[0], eye))
+            lines.append('SAMPLES\tGAZE\t%s\tRATE\t%.2f' % (eye_letter, SAMPLE_RATE))
+
+        # Merge the messages into the samples by time
+        message_times = np.array([m[0] for m in messages], dtype=np.int64)
+        message_index = np.searchsorted(t, message_times)
+        x_text = np.where(np.isnan(x), '   .', np.char.mod('%6.1f', x))
+        y_text = np.where(np.isnan(y), '   .', np.char.mod('%6.1f', y))
+        sample_lines = np.char.add(np.char.add(np.char.add(np.char.add(
+            t.astype(str), '\t'), x_text), np.char.add('\t', y_text)),
+            np.char.add('\t', np.char.mod('%7.1f\t...', pupil)))
+
+        previous = 0
+        for index, (msg_time, msg) in zip(message_index, messages):
+            lines.extend(sample_lines[previous:index].tolist())
+            lines.append('MSG\t%d %s' % (msg_time, msg))
+            previous = index
+        lines.extend(sample_lines[previous:].tolist())
+
+        if len(t):
+            lines.append('END\t%d \tSAMPLES\tEVENTS' % t[-1])
+
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
@@ -11,30 +11,61 @@ import pandas as pd
 from participantinfo import get_participant_details
 from set_up import get_monitor_and_dir, get_settings
 from eyetracker import Eyelinker
-from trial import single_trial, generate_stimuli_characteristics
-from time import time
+from triggers import get_trigger
+from trial import single_trial
+from conditions import (
+    N_BLOCKS,
+    TRIALS_PER_BLOCK,
+    create_blocks,
+    create_trial_list,
+    generate_stimuli_characteristics,
+)
+from record import trial_frame
+from warmup import warm_up, warm_up_steps
+from idle import idle_jobs
+from telemetry import telemetry
+from time import perf_counter
 from practice import practice
-import datetime as dt
+from fixation import (
+    FixationBroken,
+    FIXATION_PHASES,
+    MAX_REPEATS,
+    RECALIBRATE_AFTER,
+)
+from clocksync import ClockSync
+from realtime import RealTime, frame_stats
+from rendering import render_counter, block_stats
+from tracing import tracer
 from block import (
-    create_blocks,
     show_session_type,
-    create_trial_list,
     show_block_type,
     block_break,
     long_break,
+    fixation_break,
+    fixation_pause,
     finish,
     quick_finish,
 )
 
-N_BLOCKS = 16
-TRIALS_PER_BLOCK = 48
+FIXATION_CONTROL = False  # abort and repeat trials in which fixation is broken
+BLOCKS_PER_EDF = 1  # start a new .edf file after this many blocks (8 = at the long break)
+REALTIME = True  # high priority and no automatic garbage collection during the trials
+REALTIME_CORES = None  # e.g. [2, 3] to pin the experiment to those CPU cores
+COUNT_RENDERING = False  # count draw calls and GL state changes per trial phase
+TRACING = False  # trace where the time goes, viewable in https://ui.perfetto.dev
 
 
 def main():
     """
     Data formats / storage:
-     - eyetracking data saved in one .edf file per session
+     - eyetracking data saved in .edf files per session, split into segments
+       that are listed in one manifest .csv per session
      - all trial data saved in one .csv per session
+     - aborted trials (fixation control) saved in one .csv per session
+     - frame timing and real-time stats per trial saved in one .csv per session
+       (with the rendering counts per phase, if counted, also summed per block)
+     - traces (if traced) saved in one .json per block, as Chrome trace events
+     - tracker-to-local clock fits (and the pairs they're based on) in one .csv per session
      - subject data in one .csv (for all sessions combined)
     """
 
@@ -58,7 +89,16 @@ def main():
     new_participants, block_order = get_participant_details(old_participants, testing)
 
     # Initialise set-up
-    settings = get_settings(monitor, directory)
+    settings = get_settings(monitor, directory, testing)
+
+    if COUNT_RENDERING:
+        render_counter.enable()
+
+    if TRACING:
+        tracer.enable()
+
+    # Draw every stimulus once before the first trial
+    warm_up(settings)
 
     # Connect to eyetracker and calibrate it
     if not testing:
@@ -68,8 +108,14 @@ def main():
             settings["window"],
             settings["directory"],
         )
+
+        # The calibration display uses the window too, so warm up again afterwards
+        eyelinker.after_calibration = lambda: warm_up(settings)
         eyelinker.calibrate()
 
+        # Keep track of how the tracker's clock relates to ours
+        clock_sync = ClockSync(eyelinker.tracker.tracker_time)
+
     # Start recording eyetracker
     if not testing:
         eyelinker.start()
@@ -78,16 +124,45 @@ def main():
     practice("start", settings)
 
     # Initialise some stuff
-    start_of_experiment = time()
+    start_of_experiment = perf_counter()
     data = []
+    fixation_log = []
+    frame_log = []
     current_trial = 0
     finished_early = True
+    realtime = RealTime(REALTIME_CORES)
+    upcoming_blocks = {}
+
+    def save_data():
+        trial_frame(data).to_csv(
+            rf"{settings['directory']}\data_session_{new_participants.session_number.iloc[-1]}{'_test' if testing else ''}.csv",
+            index=False,
+        )
+
+    def save_trace(part):
+        tracer.export(
+            rf"{settings['directory']}\trace_session_{new_participants.session_number.iloc[-1]}_{part}{'_test' if testing else ''}.json"
+        )
+
+    def prepare_block(block_nr):
+        # Pseudo-randomly create conditions and target locations (so they're weighted)
+        trials = create_trial_list(8 if testing else TRIALS_PER_BLOCK)
+        upcoming_blocks[block_nr] = (
+            trials,
+            [generate_stimuli_characteristics(*trial) for trial in trials],
+        )
 
     # Start experiment
     try:
         # Generate pseudo-random order of blocks
         blocks = create_blocks(N_BLOCKS, block_order)
 
+        if REALTIME:
+            realtime.start()
+
+        # Prepare the first block while the session type is shown
+        idle_jobs.add(lambda: prepare_block(1))
+
         for block_nr, block_type in blocks:
             # Show session info if beginning of session
             if block_nr % 4 == 1:
@@ -104,8 +179,10 @@ def main():
                 # Run practice trials
                 practice(block_type, settings)
 
-            # Pseudo-randomly create conditions and target locations (so they're weighted)
-            trials_in_block = create_trial_list(8 if testing else TRIALS_PER_BLOCK)
+            # Use the trials prepared during the last break, if they're ready
+            if block_nr not in upcoming_blocks:
+                prepare_block(block_nr)
+            trials_in_block, prepared_records = upcoming_blocks.pop(block_nr)
 
             # Remind participant of block type
             calibrated = True
@@ -116,42 +193,160 @@ def main():
                     eyetracker=None if testing else eyelinker,
                 )
 
-            # Run trials per pseudo-randomly created info
-            for target_bar, congruency, cue_form in trials_in_block:
-                current_trial += 1
-                start_time = time()
+            # Run trials per pseudo-randomly created info,
+            # broken trials are added to the end of the block again
+            repeats = len(trials_in_block) * [0]
+            broken_in_a_row = 0
+            trial_index = 0
+            while trial_index < len(trials_in_block):
+                target_bar, congruency, cue_form = trials_in_block[trial_index]
+
+                # Pair the clocks and collect garbage during the inter-trial interval
+                if not testing:
+                    clock_sync.sample(block_nr)
+                realtime.collect()
+
+                # Only log the frames of this trial (not e.g. of practice trials)
+                settings["window"].frameIntervals = []
+
+                start_time = perf_counter()
 
-                stimuli_characteristics: dict = generate_stimuli_characteristics(
-                    target_bar, congruency, cue_form
+                # Trials added again (after broken fixation) get new stimuli
+                if trial_index < len(prepared_records):
+                    record = prepared_records[trial_index]
+                else:
+                    record = generate_stimuli_characteristics(
+                        target_bar, congruency, cue_form
+                    )
+
+                # Everything known before the trial, so dropped trials (see MAX_REPEATS)
+                # can also be grouped by condition
+                record.block_type = block_type
+                record.block = block_nr
+                record.condition_code = get_trigger(
+                    "just_code_please",
+                    block_type,
+                    record.cue_form,
+                    record.trial_condition,
+                    record.target_bar,
                 )
 
                 # Generate trial
-                report: dict = single_trial(
-                    **stimuli_characteristics,
-                    probe_form=block_type,
-                    settings=settings,
-                    testing=testing,
-                    eyetracker=None if testing else eyelinker,
-                )
-                end_time = time()
+                try:
+                    single_trial(
+                        record,
+                        probe_form=block_type,
+                        settings=settings,
+                        testing=testing,
+                        eyetracker=None if testing else eyelinker,
+                        fixation_phases=FIXATION_PHASES if FIXATION_CONTROL else (),
+                    )
+                except FixationBroken as broken:
+                    eyelinker.tracker.send_message(
+                        f"fixation_broken {broken.phase} {broken.reason}"
+                    )
 
-                # Save trial data
-                data.append(
+                    rescheduled = (
+                        MAX_REPEATS is None or repeats[trial_index] < MAX_REPEATS
+                    )
+                    if rescheduled:
+                        trials_in_block.append((target_bar, congruency, cue_form))
+                        repeats.append(repeats[trial_index] + 1)
+                    else:
+                        # Keep the dropped condition in the trial data, without response
+                        current_trial += 1
+                        record.trial_number = current_trial
+                        record.start_time = start_time - start_of_experiment
+                        record.end_time = perf_counter() - start_of_experiment
+                        record.dropped = True
+                        data.append(record)
+
+                    fixation_log.append(
+                        {
+                            "before_trial_number": current_trial + 1,
+                            "block": block_nr,
+                            "phase": broken.phase,
+                            "reason": broken.reason,
+                            "target_bar": target_bar,
+                            "trial_condition": congruency,
+                            "cue_form": cue_form,
+                            "repeat": repeats[trial_index],
+                            "rescheduled": rescheduled,
+                        }
+                    )
+
+                    telemetry.publish(
+                        "fixation_broken",
+                        phase=broken.phase,
+                        reason=broken.reason,
+                        rescheduled=rescheduled,
+                    )
+
+                    # Instead of repeating trials endlessly, let the participant rest
+                    # (and the experimenter recalibrate) when it keeps going wrong
+                    broken_in_a_row += 1
+                    if broken_in_a_row >= RECALIBRATE_AFTER:
+                        broken_in_a_row = 0
+                        calibrated = True
+                        while calibrated:
+                            calibrated = fixation_pause(settings, eyelinker)
+                    else:
+                        fixation_break(settings)
+
+                    trial_index += 1
+                    continue
+
+                broken_in_a_row = 0
+                end_time = perf_counter()
+                current_trial += 1
+                trial_index += 1
+
+                frames = frame_stats(settings["window"], settings["monitor"]["Hz"])
+                frame_log.append(
                     {
                         "trial_number": current_trial,
-                        "block_type": block_type,
                         "block": block_nr,
-                        "start_time": str(
-                            dt.timedelta(seconds=(start_time - start_of_experiment))
-                        ),
-                        "end_time": str(
-                            dt.timedelta(seconds=(end_time - start_of_experiment))
-                        ),
-                        **stimuli_characteristics,
-                        **report,
+                        **frames,
+                        **realtime.trial_stats(),
+                        **render_counter.trial_stats(),
                     }
                 )
 
+                # Let the experimenter follow along (see telemetry.py)
+                telemetry.publish(
+                    "trial",
+                    trial_number=current_trial,
+                    block=block_nr,
+                    condition_code=record.condition_code,
+                    performance=record.performance,
+                    response_time_in_ms=record.response_time_in_ms,
+                    dropped_frames=frames["dropped_frames"],
+                    trigger_latencies=telemetry.trial_triggers(),
+                )
+
+                # Save trial data
+                record.trial_number = current_trial
+                record.start_time = start_time - start_of_experiment
+                record.end_time = end_time - start_of_experiment
+                record.dropped = False
+                data.append(record)
+
+            telemetry.publish("block_end", block=block_nr)
+
+            # Work to do while the participant takes a break (see idle.py)
+            idle_jobs.add(realtime.collect)
+            idle_jobs.add(save_data)
+            if tracer.enabled:
+                idle_jobs.add(lambda part=f"block_{block_nr}": save_trace(part))
+            if block_nr < N_BLOCKS:
+                idle_jobs.add(lambda next_block=block_nr + 1: prepare_block(next_block))
+                idle_jobs.add(warm_up_steps(settings))
+
+            # Close this segment of the eyetracking data, so it can be
+            # transferred during the break
+            if not testing and block_nr < N_BLOCKS and block_nr % BLOCKS_PER_EDF == 0:
+                eyelinker.new_segment(block_nr + 1)
+
             # Break after end of block, unless it's the last block.
             # Experimenter can re-calibrate the eyetracker by pressing 'c' here.
             calibrated = True
@@ -160,8 +355,6 @@ def main():
                     calibrated = long_break(
                         N_BLOCKS, settings, eyetracker=None if testing else eyelinker
                     )
-                if not testing:
-                    eyelinker.start()
             elif block_nr < N_BLOCKS:
                 while calibrated:
                     calibrated = block_break(
@@ -171,22 +364,58 @@ def main():
                         eyetracker=None if testing else eyelinker,
                     )
 
+            # (Re)start recording, if it was stopped for the break
+            if not testing and block_nr < N_BLOCKS:
+                eyelinker.start()
+                clock_sync.sample(block_nr + 1)
+
         finished_early = False
 
     finally:
+        realtime.stop()
+
         # Stop eyetracker (this should also save the data)
         if not testing:
             eyelinker.stop()
 
         # Save all collected trial data to a new .csv
-        pd.DataFrame(data).to_csv(
-            rf"{settings['directory']}\data_session_{new_participants.session_number.iloc[-1]}{'_test' if testing else ''}.csv",
+        save_data()
+
+        # Save what wasn't traced yet (the rest was saved during the breaks)
+        if tracer.enabled:
+            save_trace("end")
+
+        # Save the clock fits, to align trial times with the eyetracking data
+        if not testing and clock_sync.pairs:
+            clock_sync.save(
+                settings["directory"],
+                new_participants.session_number.iloc[-1],
+                start_of_experiment=start_of_experiment,
+            )
+
+        # Save frame timing of all trials
+        frame_log = pd.DataFrame(frame_log)
+        frame_log.to_csv(
+            rf"{settings['directory']}\frame_timing_session_{new_participants.session_number.iloc[-1]}{'_test' if testing else ''}.csv",
             index=False,
         )
 
+        # Save the rendering counts per block, if they were counted
+        if render_counter.enabled and len(frame_log):
+            block_stats(frame_log).to_csv(
+                rf"{settings['directory']}\render_counts_session_{new_participants.session_number.iloc[-1]}{'_test' if testing else ''}.csv"
+            )
+
+        # Save aborted trials, if there were any
+        if fixation_log:
+            pd.DataFrame(fixation_log).to_csv(
+                rf"{settings['directory']}\fixation_log_session_{new_participants.session_number.iloc[-1]}{'_test' if testing else ''}.csv",
+                index=False,
+            )
+
         # Register how many trials this participant has completed
         new_participants.loc[new_participants.index[-1], "trials_completed"] = str(
-            len(data)
+            sum(not record.dropped for record in data)
         )
 
         # Save participant data to existing .csv file
@@ -0,0 +1,319 @@
+"""
+This file contains the functions necessary for
+fitting mixture models to the orientation reports, per participant and condition.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Every report is modelled as coming from one of three sources: the target (a von Mises
+around the target orientation), a random guess (uniform) or, optionally, a swap with
+the non-target bar (a von Mises around its orientation). Orientations live on a 180°
+circle, so all differences are doubled before treating them as angles. The models are
+fitted by expectation-maximisation from several starting points, with all starting
+points (and all bootstrap samples) fitted at once as arrays. The cells (participant x
+condition) are fitted across a process pool.
+
+usage (fits the dataset built by dataset.py in the data directory of the lab set-up):
+
+   python mixture.py --output mixture_fits.csv
+
+made by Anna van Harmelen, 2024
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from scipy import special
+
+CONDITIONS = ["trial_condition", "cue_form", "block_type"]
+
+# Starting points of the fits, every combination is tried
+START_KAPPAS = (1, 10, 100)
+START_GUESS_RATES = (0.01, 0.1, 0.4)
+START_SWAP_RATES = (0.01, 0.1, 0.4)
+
+MAX_ITERATIONS = 5000
+TOLERANCE = 1e-4  # in log likelihood
+MAX_KAPPA = 1e4
+
+BOOTSTRAPS = 1000
+BOOTSTRAPS_PER_BATCH = 100
+CONFIDENCE = 0.95
+
+
+def doubled(difference):
+    """Turns an orientation difference (in degrees) into an angle (in radians)."""
+    return np.radians(2 * ((difference + 90) % 180 - 90))
+
+
+def von_mises(cosine, kappa):
+    """The von Mises density around 0, from the cosine of the angle."""
+    # i0e keeps this finite for large kappa
+    return np.exp(kappa * (cosine - 1)) / (2 * np.pi * special.i0e(kappa))
+
+
+def mean_resultant_length(kappa):
+    return special.i1e(kappa) / special.i0e(kappa)
+
+
+def kappa_from_resultant_length(length):
+    """Approximate inverse of mean_resultant_length (Fisher, 1993)."""
+    length = np.clip(length, 0, 1 - 1e-12)
+
+    kappa = np.where(
+        length < 0.53,
+        2 * length + length**3 + 5 * length**5 / 6,
+        np.where(
+            length < 0.85,
+            -0.4 + 1.39 * length + 0.43 / (1 - length),
+            1 / (length**3 - 4 * length**2 + 3 * length),
+        ),
+    )
+
+    return np.minimum(kappa, MAX_KAPPA)
+
+
+def sd_in_degrees(kappa):
+    """The circular standard deviation of the target reports, on the 180° circle."""
+    with np.errstate(divide="ignore"):
+        return np.degrees(np.sqrt(-2 * np.log(mean_resultant_length(kappa)))) / 2
+
+
+def responsibilities(cosines, swap_cosines, kappa, guess_rate, swap_rate):
+    """Likelihood of every report under each of the sources, and their sum."""
+    target = (1 - guess_rate - swap_rate)[..., None] * von_mises(
+        cosines, kappa[..., None]
+    )
+    guess = np.broadcast_to(guess_rate[..., None] / (2 * np.pi), target.shape)
+
+    if swap_cosines is None:
+        swap = np.zeros_like(target)
+    else:
+        swap = swap_rate[..., None] * von_mises(swap_cosines, kappa[..., None])
+
+    return target, guess, swap, target + guess + swap
+
+
+def fit_mixture(errors, nontarget_errors=None, starts=None):
+    """
+    Fits the mixture model to every row of `errors` at once, by expectation-
+    maximisation. `errors` are the reports minus the targets and `nontarget_errors`
+    the non-targets minus the targets (see doubled), both of shape (..., trials).
+    Without `nontarget_errors`, there are no swaps.
+
+    Every row is fitted from all `starts` (kappa, guess rate, swap rate), by default
+    every combination of the START_ values, and the best fit is kept.
+    Returns the kappa, the guess and swap rates and the log likelihood per row.
+    """
+    errors = np.asarray(errors, dtype=float)
+
+    if starts is None:
+        starts = list(
+            product(
+                START_KAPPAS,
+                START_GUESS_RATES,
+                (0,) if nontarget_errors is None else START_SWAP_RATES,
+            )
+        )
+    starts = np.asarray(starts, dtype=float)
+
+    shape = errors.shape[:-1] + (len(starts),)
+    kappa, guess_rate, swap_rate = (
+        np.broadcast_to(start, shape).copy() for start in starts.T
+    )
+
+    # The angles only appear as cosines and sines, so these are computed once, with an
+    # extra axis for the starting points
+    cosines = np.cos(errors)[..., None, :]
+    sines = np.sin(errors)[..., None, :]
+    if nontarget_errors is None:
+        swap_cosines = swap_sines = None
+    else:
+        swap_errors = errors - np.asarray(nontarget_errors, dtype=float)
+        swap_cosines = np.cos(swap_errors)[..., None, :]
+        swap_sines = np.sin(swap_errors)[..., None, :]
+
+    log_likelihood = np.full(shape, -np.inf)
+    for _ in range(MAX_ITERATIONS):
+        target, guess, swap, total = responsibilities(
+            cosines, swap_cosines, kappa, guess_rate, swap_rate
+        )
+        new_log_likelihood = np.log(total).sum(axis=-1)
+
+        target /= total
+        swap /= total
+        guess_rate = (guess / total).mean(axis=-1)
+        swap_rate = swap.mean(axis=-1)
+
+        # Both the target and the swap reports tell something about kappa
+        resultant_sine = (target * sines).sum(axis=-1)
+        resultant_cosine = (target * cosines).sum(axis=-1)
+        if swap_cosines is not None:
+            resultant_sine += (swap * swap_sines).sum(axis=-1)
+            resultant_cosine += (swap * swap_cosines).sum(axis=-1)
+
+        weight = target.sum(axis=-1) + swap.sum(axis=-1)
+        kappa = kappa_from_resultant_length(
+            np.hypot(resultant_sine, resultant_cosine) / np.maximum(weight, 1e-12)
+        )
+
+        converged = np.all(np.abs(new_log_likelihood - log_likelihood) < TOLERANCE)
+        log_likelihood = new_log_likelihood
+        if converged:
+            break
+
+    log_likelihood = np.log(
+        responsibilities(cosines, swap_cosines, kappa, guess_rate, swap_rate)[3]
+    ).sum(axis=-1)
+
+    # Keep the best starting point of every row
+    best = np.argmax(log_likelihood, axis=-1)[..., None]
+    kappa, guess_rate, swap_rate, log_likelihood = (
+        np.take_along_axis(values, best, axis=-1)[..., 0]
+        for values in (kappa, guess_rate, swap_rate, log_likelihood)
+    )
+
+    return {
+        "kappa": kappa,
+        "guess_rate": guess_rate,
+        "swap_rate": swap_rate,
+        "log_likelihood": log_likelihood,
+    }
+
+
+def describe(fit):
+    """Turns a fit into the columns of the result."""
+    return {
+        "target_rate": 1 - fit["guess_rate"] - fit["swap_rate"],
+        "guess_rate": fit["guess_rate"],
+        "swap_rate": fit["swap_rate"],
+        "kappa": fit["kappa"],
+        "sd_in_degrees": sd_in_degrees(fit["kappa"]),
+    }
+
+
+def fit_cell(errors, nontarget_errors, n_bootstraps, seed):
+    """
+    Fits one cell (participant x condition) and, if `n_bootstraps`, bootstraps the
+    confidence intervals by refitting trials drawn with replacement (starting from
+    the fit to all trials, which is close to the fit of every bootstrap sample).
+    """
+    fit = fit_mixture(errors, nontarget_errors)
+    result = {column: float(value) for column, value in describe(fit).items()}
+    result["log_likelihood"] = float(fit["log_likelihood"])
+
+    if not n_bootstraps:
+        return result
+
+    rng = np.random.default_rng(seed)
+    samples = []
+    for start in range(0, n_bootstraps, BOOTSTRAPS_PER_BATCH):
+        size = min(BOOTSTRAPS_PER_BATCH, n_bootstraps - start)
+        trials = rng.integers(0, len(errors), (size, len(errors)))
+        samples.append(
+            describe(
+                fit_mixture(
+                    errors[trials],
+                    None if nontarget_errors is None else nontarget_errors[trials],
+                    starts=[(fit["kappa"], fit["guess_rate"], fit["swap_rate"])],
+                )
+            )
+        )
+
+    tail = (1 - CONFIDENCE) / 2 * 100
+    for column in samples[0]:
+        values = np.concatenate([sample[column] for sample in samples])
+        result[f"{column}_lower"], result[f"{column}_upper"] = np.percentile(
+            values, [tail, 100 - tail]
+        ).tolist()
+
+    return result
+
+
+def trial_errors(data):
+    """Returns the report errors and the non-target errors (see doubled) per trial."""
+    target = data.target_orientation.to_numpy(dtype=float)
+    nontarget = np.where(
+        data.target_bar == "left",
+        data.right_orientation.to_numpy(dtype=float),
+        data.left_orientation.to_numpy(dtype=float),
+    )
+
+    return (
+        doubled(data.report_orientation.to_numpy(dtype=float) - target),
+        doubled(nontarget - target),
+    )
+
+
+def fit_study(
+    data,
+    swaps=True,
+    n_bootstraps=BOOTSTRAPS,
+    conditions=CONDITIONS,
+    max_workers=None,
+    seed=0,
+):
+    """
+    Fits the mixture model per participant and condition of the dataset (see
+    dataset.load_dataset) and returns one row per cell as a DataFrame.
+    """
+    data = data.reset_index()
+    data = data[data.report_orientation.notna()]
+
+    errors, nontarget_errors = trial_errors(data)
+    cells = list(data.groupby(["participant_number", *conditions]).indices.items())
+    seeds = np.random.SeedSequence(seed).generate_state(len(cells)).tolist()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        fits = pool.map(
+            fit_cell,
+            [errors[trials] for _, trials in cells],
+            [nontarget_errors[trials] if swaps else None for _, trials in cells],
+            [n_bootstraps] * len(cells),
+            seeds,
+        )
+
+        return pd.DataFrame(
+            [
+                {
+                    **dict(zip(["participant_number", *conditions], cell)),
+                    "trials": len(trials),
+                    **fit,
+                }
+                for (cell, trials), fit in zip(cells, fits)
+            ]
+        )
+
+
+def main():
+    # Only needed here, so worker processes don't have to import psychopy
+    from set_up import get_monitor_and_dir
+    from dataset import load_dataset
+
+    parser = argparse.ArgumentParser(description="Mixture models of the reports.")
+    parser.add_argument("--dataset", help="directory of the dataset (see dataset.py)")
+    parser.add_argument("--no-swaps", action="store_true", help="fit target + guess")
+    parser.add_argument("--bootstraps", type=int, default=BOOTSTRAPS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="save the fits to this .csv")
+    arguments = parser.parse_args()
+
+    dataset = arguments.dataset
+    if dataset is None:
+        dataset = os.path.join(get_monitor_and_dir(False)[1], "dataset")
+
+    fits = fit_study(
+        load_dataset(dataset),
+        swaps=not arguments.no_swaps,
+        n_bootstraps=arguments.bootstraps,
+        max_workers=arguments.workers,
+    )
+    print(fits.to_string(index=False))
+
+    if arguments.output:
+        fits.to_csv(arguments.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
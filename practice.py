@@ -6,11 +6,8 @@ To run the 'location-by-colour null-cue' experiment, see main.py.
 made by Anna van Harmelen, 2024
 """
 
-from trial import (
-    single_trial,
-    generate_stimuli_characteristics,
-    show_text,
-)
+from trial import single_trial, show_text, show_feedback
+from conditions import generate_stimuli_characteristics
 from stimuli import make_one_bar, create_fixation_dot
 from response import get_response, wait_for_key
 from psychopy import event
@@ -60,13 +57,13 @@ def practice_dial(next_block, settings):
             target = generate_stimuli_characteristics(target_bar, congruency, cue_form)
 
             practice_bar = make_one_bar(
-                target["target_orientation"], "#eaeaea", "middle", settings
+                target.target_orientation, "#eaeaea", "middle", settings
             )
 
-            report: dict = get_response(
+            report = get_response(
                 "colour_probe",
                 cue_form,
-                target["target_orientation"],
+                target.target_orientation,
                 None,
                 1,
                 target_bar,
@@ -77,11 +74,7 @@ def practice_dial(next_block, settings):
             )
 
             create_fixation_dot(settings)
-            show_text(
-                f"{report['performance']}",
-                settings["window"],
-                (0, settings["deg2pix"](0.7)),
-            )
+            show_feedback(report.performance, settings)
             settings["window"].flip()
             sleep(0.5)
 
@@ -112,8 +105,8 @@ def practice_indefinitely(block_type, first_block, settings):
                 target_bar, congruency, cue_form
             )
 
-            report: dict = single_trial(
-                **stimulus, probe_form=block_type, settings=settings, testing=True
+            single_trial(
+                stimulus, probe_form=block_type, settings=settings, testing=True
             )
 
     except KeyboardInterrupt:
@@ -158,9 +151,7 @@ def practice_n_trials(block_type, n_trials, settings):
 
         stimulus = generate_stimuli_characteristics(target_bar, congruency, cue_form)
 
-        report: dict = single_trial(
-            **stimulus, probe_form=block_type, settings=settings, testing=True
-        )
+        single_trial(stimulus, probe_form=block_type, settings=settings, testing=True)
 
     show_text(
         "You finished the practice trials.\n\nPress SPACE to start the session.",
@@ -0,0 +1,120 @@
+"""
+This file contains the functions necessary for
+running the trials with as few interruptions as possible (real-time mode)
+and for logging the frame timing of every trial.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+In real-time mode the process gets a high priority, can be pinned to chosen
+CPU cores, and Python's automatic garbage collection is switched off.
+Garbage is then only collected when nothing is timed: between trials and
+during breaks.
+
+made by Anna van Harmelen, 2024
+"""
+
+from psychopy import core
+from time import perf_counter
+import numpy as np
+import psutil
+import gc
+
+DROPPED_FRAME_FACTOR = 1.5  # frames longer than this many refresh periods are dropped
+
+
+class RealTime:
+    """
+    usage:
+
+       realtime = RealTime(cores=[2, 3])
+       realtime.start()
+       ...
+       realtime.collect()  # between trials and at breaks
+       ...
+       realtime.stop()
+    """
+
+    def __init__(self, cores=None):
+        self.cores = cores
+        self.high_priority = False
+        self.pinned = False
+        self.running = False
+        self.collections_avoided = 0
+        self.collect_time = 0
+
+    def start(self):
+        if self.running:
+            return
+
+        self.high_priority = bool(core.rush(True))
+
+        if self.cores:
+            # Not every OS supports this (e.g. macOS)
+            try:
+                psutil.Process().cpu_affinity(self.cores)
+                self.pinned = True
+            except (AttributeError, ValueError, OSError) as error:
+                print(f"WARNING: could not pin the experiment to cores {self.cores}: {error}")
+
+        # Move everything made during set-up out of the collector's way,
+        # and stop it from running by itself
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        self.running = True
+
+    def stop(self):
+        if not self.running:
+            return
+
+        gc.unfreeze()
+        gc.enable()
+        core.rush(False)
+        self.high_priority = False
+        self.running = False
+
+    def collect(self):
+        """
+        Collects garbage now, only call this when nothing is being timed.
+        Keeps track of how many automatic collections this replaced.
+        """
+        if not self.running:
+            return
+
+        self.collections_avoided += gc.get_count()[0] // gc.get_threshold()[0]
+
+        start = perf_counter()
+        gc.collect()
+        self.collect_time += perf_counter() - start
+
+    def trial_stats(self):
+        """Returns (and resets) the real-time stats since the last call."""
+        stats = {
+            "realtime": self.running,
+            "high_priority": self.high_priority,
+            "pinned_to_cores": str(self.cores) if self.pinned else None,
+            "gc_collections_avoided": self.collections_avoided,
+            "gc_collect_time_in_ms": round(self.collect_time * 1000, 2),
+        }
+
+        self.collections_avoided = 0
+        self.collect_time = 0
+
+        return stats
+
+
+def frame_stats(window, hz):
+    """
+    Returns (and resets) statistics of the frame intervals the window recorded,
+    i.e. of the frames during which `window.recordFrameIntervals` was on.
+    """
+    intervals = np.array(window.frameIntervals)
+    window.frameIntervals = []
+
+    if not len(intervals):
+        return {"frames": 0, "longest_frame_in_ms": None, "dropped_frames": 0}
+
+    return {
+        "frames": len(intervals),
+        "longest_frame_in_ms": round(intervals.max() * 1000, 2),
+        "dropped_frames": int(np.sum(intervals > DROPPED_FRAME_FACTOR / hz)),
+    }
@@ -0,0 +1,91 @@
+"""
+This file contains the record that holds everything about one trial, from its
+stimuli to the response, and the conversion of these records to the trial data .csv.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+One TrialRecord is made per trial and filled in place by
+generate_stimuli_characteristics, main.py, get_response and evaluate_response.
+Only when the data is saved are the records turned into the columns of the .csv
+(see trial_frame).
+
+made by Anna van Harmelen, 2024
+"""
+
+from operator import attrgetter
+import datetime as dt
+import pandas as pd
+
+# Trial columns in the order main.py writes them, and the attributes of a TrialRecord
+TRIAL_COLUMNS = {
+    # Set by main.py
+    "trial_number": int,
+    "block_type": str,
+    "block": int,
+    "start_time": "timedelta",  # in seconds since the start of the experiment
+    "end_time": "timedelta",
+    # Set by generate_stimuli_characteristics
+    "ITI": float,
+    "stimuli_colours": "list",
+    "cue_form": str,
+    "capture_colour": "list",
+    "capture_location": str,
+    "trial_condition": str,
+    "left_orientation": int,
+    "right_orientation": int,
+    "target_bar": str,
+    "target_colour": "list",
+    "target_orientation": int,
+    # Set by main.py, before the trial
+    "condition_code": str,
+    # Set by get_response
+    "idle_reaction_time_in_ms": float,
+    "response_time_in_ms": float,
+    "key_pressed": str,
+    "turns_made": int,
+    # Set by evaluate_response
+    "report_orientation": int,
+    "performance": int,
+    "absolute_difference": int,
+    "correct_key": bool,
+    "signed_difference": int,
+    # Set by main.py, True if fixation control gave up on the trial (see MAX_REPEATS)
+    "dropped": bool,
+}
+
+
+class TrialRecord:
+    """
+    Everything about one trial, one slot per trial column (None until it's set).
+    Without a __dict__, setting a misspelled column raises an AttributeError.
+    """
+
+    __slots__ = tuple(TRIAL_COLUMNS)
+
+    def __init__(self, **values):
+        for column in TRIAL_COLUMNS:
+            setattr(self, column, values.pop(column, None))
+
+        if values:
+            raise Exception(f"Expected TRIAL_COLUMNS, but received {list(values)}.")
+
+    def __repr__(self):
+        values = (f"{column}={getattr(self, column)!r}" for column in self.__slots__)
+        return f"TrialRecord({', '.join(values)})"
+
+
+row = attrgetter(*TRIAL_COLUMNS)
+
+
+def trial_frame(records):
+    """Turns a list of TrialRecords into the columns of the trial data .csv."""
+    data = pd.DataFrame(
+        [row(record) for record in records], columns=list(TRIAL_COLUMNS)
+    )
+
+    for column in ("start_time", "end_time"):
+        data[column] = [
+            None if pd.isna(seconds) else str(dt.timedelta(seconds=seconds))
+            for seconds in data[column]
+        ]
+
+    return data
@@ -0,0 +1,196 @@
+"""
+This file contains the functions necessary for
+counting the rendering work done in every phase of a trial.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+When enabled, the draw() and flip() methods, the constructors and the vertex- and
+colour-related attributes of the stimuli used in the experiment are wrapped, so every
+draw call, flip, new stimulus, vertex update and state change is counted for the
+phase that's being drawn. When disabled (the default) nothing is wrapped at all,
+and single_trial only pays for one `if` per phase.
+
+made by Anna van Harmelen, 2024
+"""
+
+from collections import Counter
+from functools import wraps
+from psychopy import visual
+
+PHASES = (
+    "iti",
+    "stimuli",
+    "delay",
+    "capture_cue",
+    "cue_delay",
+    "probe",
+    "dial",
+    "feedback",
+    "other",
+)
+KINDS = ("draws", "flips", "stims_created", "vertex_updates", "state_changes")
+
+# Setting these makes PsychoPy recalculate (and upload) the vertices of a stimulus
+VERTEX_ATTRIBUTES = ("pos", "ori", "size", "vertices", "radius", "width", "height")
+# Setting these changes the colour or other GL state used to draw a stimulus
+STATE_ATTRIBUTES = ("fillColor", "lineColor", "color", "opacity", "lineWidth", "text")
+
+STIMULUS_CLASSES = ("Circle", "Rect", "ShapeStim", "TextStim", "ImageStim")
+
+
+class CountedAttribute:
+    """Wraps an attribute descriptor, counting every time it's set outside PsychoPy."""
+
+    def __init__(self, descriptor, counter, kind, name):
+        self.descriptor = descriptor
+        self.counter = counter
+        self.kind = kind
+        self.name = name
+
+    def __get__(self, stim, owner=None):
+        if stim is None:
+            return self
+        if not hasattr(self.descriptor, "__get__"):
+            # PsychoPy's attributeSetter only has __set__ and stores the value in
+            # the stim's __dict__, where Python would otherwise have read it from
+            try:
+                return stim.__dict__[self.name]
+            except KeyError:
+                return self.descriptor
+
+        # Some getters set attributes themselves (e.g. TextStim.size), not counted
+        self.counter.depth += 1
+        try:
+            return self.descriptor.__get__(stim, owner)
+        finally:
+            self.counter.depth -= 1
+
+    def __getattr__(self, name):
+        # PsychoPy also uses the wrapped properties directly, e.g. WindowMixin.size.fset
+        return getattr(self.descriptor, name)
+
+    def __set__(self, stim, value):
+        if not self.counter.depth:
+            self.counter.current[self.kind] += 1
+
+        # Setters that set other attributes (e.g. width sets size) count once
+        self.counter.depth += 1
+        try:
+            self.descriptor.__set__(stim, value)
+        finally:
+            self.counter.depth -= 1
+
+
+class RenderCounter:
+    """
+    usage:
+
+       render_counter.enable()
+       ...
+       render_counter.set_phase("stimuli")  # in single_trial, before drawing a screen
+       ...
+       render_counter.trial_stats()  # after every trial
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.depth = 0  # > 0 inside a counted call, so PsychoPy's own calls don't count
+        self.counts = {phase: Counter() for phase in PHASES}
+        self.current = self.counts["other"]
+        self.originals = []
+
+    def set_phase(self, phase):
+        if self.enabled:
+            self.current = self.counts[phase]
+
+    def enable(self):
+        if self.enabled:
+            return
+
+        classes = [getattr(visual, name) for name in STIMULUS_CLASSES]
+
+        for cls in classes:
+            self.wrap_method(cls, "__init__", "stims_created")
+            self.wrap_method(cls, "draw", "draws")
+
+            for name in VERTEX_ATTRIBUTES:
+                self.wrap_attribute(cls, name, "vertex_updates")
+            for name in STATE_ATTRIBUTES:
+                self.wrap_attribute(cls, name, "state_changes")
+
+        self.wrap_method(visual.Window, "flip", "flips")
+        self.enabled = True
+
+    def disable(self):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+
+        self.originals = []
+        self.current = self.counts["other"]
+        self.enabled = False
+
+    def wrap_method(self, cls, name, kind):
+        owner = defining_class(cls, name)
+        if owner is None or self.wrapped(owner, name):
+            return
+
+        method = owner.__dict__[name]
+        counter = self
+
+        @wraps(method)
+        def counted(*args, **kwargs):
+            if not counter.depth:
+                counter.current[kind] += 1
+
+            counter.depth += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                counter.depth -= 1
+
+        self.originals.append((owner, name, method))
+        setattr(owner, name, counted)
+
+    def wrap_attribute(self, cls, name, kind):
+        owner = defining_class(cls, name)
+        if owner is None or self.wrapped(owner, name):
+            return
+
+        descriptor = owner.__dict__[name]
+        if not hasattr(descriptor, "__set__"):
+            return
+
+        self.originals.append((owner, name, descriptor))
+        setattr(owner, name, CountedAttribute(descriptor, self, kind, name))
+
+    def wrapped(self, owner, name):
+        return any(o is owner and n == name for o, n, _ in self.originals)
+
+    def trial_stats(self):
+        """Returns (and resets) the counts per phase since the last call."""
+        if not self.enabled:
+            return {}
+
+        stats = {
+            f"{phase}_{kind}": self.counts[phase][kind]
+            for phase in PHASES
+            for kind in KINDS
+        }
+
+        for counts in self.counts.values():
+            counts.clear()
+
+        return stats
+
+
+def defining_class(cls, name):
+    """Returns the class in the MRO of `cls` that defines `name`, if any."""
+    return next((owner for owner in cls.__mro__ if name in owner.__dict__), None)
+
+
+def block_stats(frame_log):
+    """Sums the per-trial counts in the frame log (a DataFrame) per block."""
+    columns = [f"{phase}_{kind}" for phase in PHASES for kind in KINDS]
+    return frame_log.groupby("block")[columns].sum()
+
+
+render_counter = RenderCounter()
@@ -10,11 +10,18 @@ from psychopy import core, visual, event
 from psychopy.hardware.keyboard import Keyboard
 from math import cos, sin, degrees
 from stimuli import create_fixation_dot
-from time import time
-from eyetracker import get_trigger
+from time import time, sleep
+from triggers import get_trigger
+from idle import idle_jobs
+from telemetry import telemetry
+from record import TrialRecord
+from scoring import score
+from rendering import render_counter
+from tracing import tracer, traced
 
 RESPONSE_DIAL_SIZE = 2  # radius of circle
 RESPONSE_DIAL_ECCENTRICITY = 6
+IDLE_POLL_INTERVAL = 0.005  # in seconds, between keyboard checks when there's no work
 
 
 def turn_handle(pos, origin, dial_step_size):
@@ -38,29 +45,15 @@ def get_report_orientation(key, turns, dial_step_size):
     return report_orientation
 
 
-def evaluate_response(report_orientation, target_orientation, key):
-    report_orientation = round(report_orientation)
+def evaluate_response(report_orientation, target_orientation, key, record=None):
+    """Fills in (and returns) the evaluation, in a new TrialRecord if not given."""
+    if record is None:
+        record = TrialRecord()
 
-    signed_difference = target_orientation - report_orientation
-    abs_difference = abs(target_orientation - report_orientation)
+    for column, value in score(report_orientation, target_orientation, key).items():
+        setattr(record, column, value.item())
 
-    if abs_difference > 90:
-        abs_difference -= 180
-        abs_difference *= -1
-
-    performance = round(100 - abs_difference / 90 * 100)
-
-    correct_key = (target_orientation > 0 and key == "m") or (
-        target_orientation < 0 and key == "z"
-    )
-
-    return {
-        "report_orientation": report_orientation,
-        "performance": performance,
-        "absolute_difference": abs_difference,
-        "correct_key": correct_key,
-        "signed_difference": signed_difference,
-    }
+    return record
 
 
 def make_circle(rad, settings, pos=(0, 0), handle=False, colour=None):
@@ -107,6 +100,7 @@ def make_dial(settings, position=[], colour=None):
     return dial_circle, top_dial, bottom_dial
 
 
+@traced("response")
 def get_response(
     probe_form,
     cue_form,
@@ -118,6 +112,7 @@ def get_response(
     testing,
     eyetracker,
     additional_objects=[],
+    record=None,
 ):
     keyboard: Keyboard = settings["keyboard"]
     window = settings["window"]
@@ -133,10 +128,14 @@ def get_response(
 
     # Wait indefinitely until the participant starts giving an answer
     keyboard.clearEvents()  # do it again to be sure
-    pressed = event.waitKeys(keyList=["z", "m", "q"])
+    with tracer.span("wait_for_response"):
+        pressed = event.waitKeys(keyList=["z", "m", "q"])
 
     response_started = time()
     idle_reaction_time = response_started - idle_reaction_time_start
+    telemetry.publish(
+        "response_started", idle_reaction_time_in_ms=round(idle_reaction_time * 1000)
+    )
 
     if "m" in pressed:
         key = "m"
@@ -161,44 +160,73 @@ def get_response(
         trigger = get_trigger(
             "response_onset", probe_form, cue_form, trial_condition, target_bar
         )
-        eyetracker.tracker.send_message(f"trig{trigger}")
+        telemetry.send_trigger(eyetracker, "response_onset", trigger)
 
-    while not keyboard.getKeys(keyList=[key]) and turns < settings["monitor"]["Hz"]:
-        top_dial.pos = turn_handle(top_dial.pos, dial_circle.pos, rad)
-        bottom_dial.pos = turn_handle(bottom_dial.pos, dial_circle.pos, rad)
+    # Only the dial flips every frame, so only log its frame intervals
+    window.recordFrameIntervals = True
+    render_counter.set_phase("dial")
 
-        turns += 1
+    with tracer.span("dial"):
+        while turns < settings["monitor"]["Hz"]:
+            with tracer.span("keyboard"):
+                released = keyboard.getKeys(keyList=[key])
+            if released:
+                break
 
-        for item in additional_objects:
-            item.draw()
+            top_dial.pos = turn_handle(top_dial.pos, dial_circle.pos, rad)
+            bottom_dial.pos = turn_handle(bottom_dial.pos, dial_circle.pos, rad)
 
-        dial_circle.draw()
-        top_dial.draw()
-        bottom_dial.draw()
+            turns += 1
 
-        if not additional_objects:
-            create_fixation_dot(settings)
+            for item in additional_objects:
+                item.draw()
 
-        window.flip()
+            dial_circle.draw()
+            top_dial.draw()
+            bottom_dial.draw()
+
+            if not additional_objects:
+                create_fixation_dot(settings)
 
+            with tracer.span("flip"):
+                window.flip()
+
+    window.recordFrameIntervals = False
     response_time = time() - response_started
 
-    return {
-        "idle_reaction_time_in_ms": round(idle_reaction_time * 1000, 2),
-        "response_time_in_ms": round(response_time * 1000, 2),
-        "key_pressed": key,
-        "turns_made": turns,
-        **evaluate_response(
-            get_report_orientation(key, turns, settings["dial_step_size"]),
-            target_orientation,
-            key,
-        ),
-    }
+    if record is None:
+        record = TrialRecord()
+
+    record.idle_reaction_time_in_ms = round(idle_reaction_time * 1000, 2)
+    record.response_time_in_ms = round(response_time * 1000, 2)
+    record.key_pressed = key
+    record.turns_made = turns
+
+    return evaluate_response(
+        get_report_orientation(key, turns, settings["dial_step_size"]),
+        target_orientation,
+        key,
+        record,
+    )
 
 
+@traced()
 def wait_for_key(key_list, keyboard):
+    """
+    Waits for one of the keys in `key_list`, while running the queued idle jobs
+    (see idle.py) in small slices, and returns the pressed keys.
+    """
     keyboard: Keyboard = keyboard
     keyboard.clearEvents()
-    keys = event.waitKeys(keyList=key_list)
+    event.clearEvents()
+
+    keys = event.getKeys(keyList=key_list)
+    while not keys:
+        if idle_jobs:
+            idle_jobs.run()
+        else:
+            sleep(IDLE_POLL_INTERVAL)
+
+        keys = event.getKeys(keyList=key_list)
 
     return keys
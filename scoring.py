@@ -0,0 +1,45 @@
+"""
+This file contains the functions necessary for
+scoring the reported orientations against the target orientations.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Nothing in here draws anything, so it's also used without psychopy (e.g. by
+simulation.py). It works on single trials (see evaluate_response in response.py) as
+well as on arrays of trials.
+
+made by Anna van Harmelen, 2024
+"""
+
+import numpy as np
+
+
+def score(report_orientation, target_orientation, key=None):
+    """
+    Scores reports (in degrees) against target orientations, as numbers or arrays.
+    Returns the (rounded) report orientation, the performance (0-100), the absolute
+    and signed differences and whether `key` was the side the target is tilted to.
+    """
+    report_orientation = np.round(report_orientation).astype(int)
+
+    signed_difference = target_orientation - report_orientation
+    absolute_difference = np.abs(signed_difference)
+
+    # Orientations repeat every 180 degrees
+    absolute_difference = np.where(
+        absolute_difference > 90, 180 - absolute_difference, absolute_difference
+    )
+
+    performance = np.round(100 - absolute_difference / 90 * 100).astype(int)
+
+    key = np.asarray(key)
+    correct_key = ((target_orientation > 0) & (key == "m")) | (
+        (target_orientation < 0) & (key == "z")
+    )
+
+    return {
+        "report_orientation": report_orientation,
+        "performance": performance,
+        "absolute_difference": absolute_difference,
+        "correct_key": correct_key,
+        "signed_difference": signed_difference,
+    }
@@ -9,34 +9,88 @@ made by Anna van Harmelen, 2024
 from psychopy import visual
 from psychopy.hardware.keyboard import Keyboard
 from math import degrees, atan2, pi
+from time import perf_counter
+import numpy as np
+import json
+import os
 
+MONITOR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitors")
+
+# Allowed difference between measured and expected refresh rate
+HZ_WARNING_MARGIN = 0.02  # 2%: warn, but continue
+HZ_REFUSE_MARGIN = 0.1  # 10%: don't start (unless testing)
+MEASURED_FRAMES = 300
+
+
+def get_monitor_and_dir(testing: bool, profile=None):
+    """
+    Loads a monitor profile from monitors/<profile>.json, by default
+    'laptop' when testing and 'lab' otherwise. A profile contains:
+     - resolution: in pixels
+     - Hz: screen refresh rate in Hz
+     - width: in cm
+     - distance: in cm
+     - directory: where all data is saved
+    """
+    if profile is None:
+        profile = "laptop" if testing else "lab"
+
+    with open(os.path.join(MONITOR_DIRECTORY, f"{profile}.json")) as file:
+        monitor = json.load(file)
+
+    monitor["resolution"] = tuple(monitor["resolution"])
+    directory = monitor.pop("directory")
 
-def get_monitor_and_dir(testing: bool):
-    if testing:
-        # laptop
-        monitor = {
-            "resolution": (1920, 1080),  # in pixels
-            "Hz": 60,  # screen refresh rate in Hz
-            "width": 33,  # in cm
-            "distance": 50,  # in cm
-        }
-
-        directory = r"..\..\Data\Vidi3 - location-by-colour\test"
-
-    else:
-        # lab
-        monitor = {
-            "resolution": (1920, 1080),  # in pixels
-            "Hz": 239,  # screen refresh rate in Hz
-            "width": 53,  # in cm
-            "distance": 70,  # in cm
-        }
-
-        directory = r"C:\Users\vidi_asa\Desktop\Location-by-colour data"
-    
     return monitor, directory
 
-def get_settings(monitor: dict, directory):
+
+def measure_refresh_rate(window, n_frames=MEASURED_FRAMES):
+    """
+    Flips the window `n_frames` times and returns the refresh rate (in Hz)
+    and the standard deviation of the frame intervals (in ms).
+    """
+    # Let the frame rate settle first
+    for _ in range(10):
+        window.flip()
+
+    flip_times = np.empty(n_frames + 1)
+    for frame in range(n_frames + 1):
+        window.flip()
+        flip_times[frame] = perf_counter()
+
+    intervals = np.diff(flip_times)
+
+    return 1 / np.median(intervals), intervals.std() * 1000
+
+
+def check_refresh_rate(monitor: dict, window, testing=False):
+    """
+    Measures the refresh rate and returns the monitor profile with the measured
+    rate as "Hz", so all frame-based timing uses it. Refuses to start if it
+    is far off the profile (only warns when testing).
+    """
+    measured, jitter = measure_refresh_rate(window)
+    difference = abs(measured - monitor["Hz"]) / monitor["Hz"]
+
+    message = (
+        f"Measured a refresh rate of {measured:.1f} Hz (frame interval sd: {jitter:.2f} ms), "
+        f"but the monitor profile says {monitor['Hz']} Hz."
+    )
+    if difference > HZ_REFUSE_MARGIN and not testing:
+        window.close()
+        raise Exception(message + " :(")
+    elif difference > HZ_WARNING_MARGIN:
+        print(f"WARNING: {message}")
+
+    return {
+        **monitor,
+        "Hz": measured,
+        "profile_Hz": monitor["Hz"],
+        "frame_interval_sd_in_ms": jitter,
+    }
+
+
+def get_settings(monitor: dict, directory, testing=False):
     window = visual.Window(
         color=('#7F7F7F'),
         size=monitor["resolution"],
@@ -44,6 +98,9 @@ def get_settings(monitor: dict, directory):
         fullscr=True,
     )
 
+    # Use the actual refresh rate for all frame-based timing
+    monitor = check_refresh_rate(monitor, window, testing)
+
     degrees_per_pixel = degrees(atan2(0.5 * monitor["width"], monitor["distance"])) / (
         0.5 * monitor["resolution"][0]
     )
@@ -64,3 +121,33 @@ def get_settings(monitor: dict, directory):
 
         directory=directory,
     )
+
+
+def get_offscreen_settings(monitor: dict, directory=None, keyboard=None):
+    """
+    Like get_settings, but in a normal window that doesn't wait for the screen
+    refresh and without measuring it, for running trials unattended (see soak.py
+    and snapshots.py).
+    """
+    window = visual.Window(
+        color=("#7F7F7F"),
+        size=monitor["resolution"],
+        units="pix",
+        fullscr=False,
+        waitBlanking=False,
+        checkTiming=False,
+    )
+
+    degrees_per_pixel = degrees(atan2(0.5 * monitor["width"], monitor["distance"])) / (
+        0.5 * monitor["resolution"][0]
+    )
+
+    return dict(
+        deg2pix=lambda deg: round(deg / degrees_per_pixel),
+        dial_step_size=(0.5 * pi) / monitor["Hz"],
+        window=window,
+        keyboard=keyboard,
+        mouse=visual.CustomMouse(win=window, visible=False),
+        monitor=monitor,
+        directory=directory,
+    )
@@ -0,0 +1,250 @@
+"""
+This file contains the functions necessary for
+estimating the power of different designs of the experiment by simulation.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Every simulated study draws synthetic participants, gives each of them the trials the
+experiment itself would make (create_blocks, create_trial_list and
+generate_stimuli_characteristics, see conditions.py) and scores their responses with
+the scoring of the experiment itself (see scoring.py).
+Participants report the target orientation with some error, which is larger in
+incongruent trials (the congruency effect), and their gaze shifts towards the side the
+capture cue points at (the gaze bias). Both effects can differ between cue forms and
+block types (probe forms), so designs with a different mix of these differ. Per
+study, both effects are tested across participants, and the power of a design is the
+share of studies in which they're significant. Studies are simulated in chunks across
+a process pool.
+
+usage (runs the default sweep over designs):
+
+   python simulation.py
+
+made by Anna van Harmelen, 2024
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import random
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import stats
+from conditions import (
+    create_blocks,
+    create_trial_list,
+    generate_stimuli_characteristics,
+)
+from scoring import score
+
+# Assumed effects, all in degrees
+EFFECTS = {
+    "response_error": 18,  # sd of the response error in congruent trials
+    "response_error_sd": 5,  # between participants
+    "congruency_effect": 2,  # extra response error sd in incongruent trials
+    "congruency_effect_sd": 3,  # between participants
+    "gaze_bias": 0.1,  # mean gaze shift towards the side of a location cue
+    "gaze_bias_sd": 0.15,  # between participants
+    "gaze_noise": 0.5,  # sd of the gaze shift between trials
+    # The effects after colour cues and in colour-probe blocks, relative to those
+    # after location cues and in location-probe blocks
+    "colour_cue_congruency_scale": 1,
+    "colour_probe_congruency_scale": 1,
+    "colour_cue_gaze_scale": 0.5,
+    "colour_probe_gaze_scale": 0.75,
+}
+
+# The default sweep over designs
+SWEEP_PARTICIPANTS = (16, 24, 32)
+SWEEP_BLOCKS = (8, 16)
+SWEEP_TRIALS_PER_BLOCK = (32, 48)
+# Only the mix of probe forms matters, not their order (see create_blocks)
+SWEEP_BLOCK_ORDERS = ("LCLC", "LLLC", "CCCL")
+
+STUDIES = 1000
+STUDIES_PER_CHUNK = 25
+ALPHA = 0.05
+
+
+def scaled(effect, name, effects, cue_forms, block_types):
+    """An effect per trial, scaled by the cue form and the block type (see EFFECTS)."""
+    return (
+        effect
+        * np.where(cue_forms == "colour_cue", effects[f"colour_cue_{name}_scale"], 1)
+        * np.where(
+            block_types == "colour_probe", effects[f"colour_probe_{name}_scale"], 1
+        )
+    )
+
+
+def simulate_participant(design, effects, rng):
+    """
+    Returns whether each trial was incongruent, its performance (see score) and the
+    gaze shift towards the side the capture cue points at, for one participant.
+    """
+    trials = [
+        (block_type, generate_stimuli_characteristics(*trial))
+        for _, block_type in create_blocks(design["blocks"], design["block_order"])
+        for trial in create_trial_list(design["trials_per_block"])
+    ]
+
+    block_types = np.array([block_type for block_type, _ in trials])
+    cue_forms = np.array([trial.cue_form for _, trial in trials])
+    incongruent = np.array(
+        [trial.trial_condition == "incongruent" for _, trial in trials]
+    )
+    targets = np.array([trial.target_orientation for _, trial in trials])
+    cued_side = np.array(
+        [1 if trial.capture_location == "right" else -1 for _, trial in trials]
+    )
+
+    # This participant's response error and effects
+    error = max(
+        rng.normal(effects["response_error"], effects["response_error_sd"]), 1
+    )
+    congruency_effect = rng.normal(
+        effects["congruency_effect"], effects["congruency_effect_sd"]
+    )
+    gaze_bias = rng.normal(effects["gaze_bias"], effects["gaze_bias_sd"])
+
+    congruency_effect = scaled(
+        congruency_effect, "congruency", effects, cue_forms, block_types
+    )
+    sd = np.where(incongruent, np.maximum(error + congruency_effect, 1), error)
+
+    # The dial stops after a quarter turn (see get_response), so reports can't go
+    # beyond ±90 degrees
+    reports = np.clip(targets + rng.normal(0, sd), -90, 90)
+
+    # Horizontal gaze (positive is rightwards) shifts towards the cued side, and is
+    # analysed as towardness, like gazebias.py does
+    gaze = cued_side * scaled(
+        gaze_bias, "gaze", effects, cue_forms, block_types
+    ) + rng.normal(0, effects["gaze_noise"], len(trials))
+
+    return incongruent, score(reports, targets)["performance"], cued_side * gaze
+
+
+def simulate_studies(design, effects, n_studies, seed):
+    """
+    Simulates `n_studies` studies of one design and returns the p-values of the
+    congruency effect and of the gaze bias (one-sided), one per study.
+    """
+    rng = np.random.default_rng(seed)
+    random.seed(seed)
+
+    shape = (n_studies, design["participants"])
+    congruent = np.empty(shape)
+    incongruent = np.empty(shape)
+    gaze = np.empty(shape)
+
+    for study, participant in np.ndindex(shape):
+        is_incongruent, scores, gaze_shift = simulate_participant(design, effects, rng)
+        congruent[study, participant] = scores[~is_incongruent].mean()
+        incongruent[study, participant] = scores[is_incongruent].mean()
+        gaze[study, participant] = gaze_shift.mean()
+
+    # All studies of this chunk are tested at once, along the participant axis
+    congruency_p = stats.ttest_rel(
+        congruent, incongruent, axis=1, alternative="greater"
+    )
+    gaze_p = stats.ttest_1samp(gaze, 0, axis=1, alternative="greater")
+
+    return (
+        congruency_p.pvalue,
+        gaze_p.pvalue,
+        (congruent - incongruent).mean(axis=1),
+        gaze.mean(axis=1),
+    )
+
+
+def estimate_power(
+    designs,
+    effects=EFFECTS,
+    n_studies=STUDIES,
+    alpha=ALPHA,
+    max_workers=None,
+    seed=0,
+):
+    """
+    Estimates the power of every design (a dict with participants, blocks,
+    trials_per_block and block_order, i.e. the mix of probe forms) and returns them
+    as a DataFrame.
+    """
+    chunks = []
+    for index, design in enumerate(designs):
+        for start in range(0, n_studies, STUDIES_PER_CHUNK):
+            chunks.append((index, design, min(STUDIES_PER_CHUNK, n_studies - start)))
+
+    seeds = np.random.SeedSequence(seed).generate_state(len(chunks)).tolist()
+
+    results = {index: [] for index in range(len(designs))}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for (index, _, _), result in zip(
+            chunks,
+            pool.map(
+                simulate_studies,
+                [design for _, design, _ in chunks],
+                [effects] * len(chunks),
+                [size for _, _, size in chunks],
+                seeds,
+            ),
+        ):
+            results[index].append(result)
+
+    power = []
+    for index, design in enumerate(designs):
+        congruency_p, gaze_p, congruency_effect, gaze_bias = (
+            np.concatenate(parts) for parts in zip(*results[index])
+        )
+        power.append(
+            {
+                **design,
+                "trials_per_participant": design["blocks"]
+                * design["trials_per_block"],
+                "congruency_power": np.mean(congruency_p < alpha),
+                "gaze_bias_power": np.mean(gaze_p < alpha),
+                "mean_congruency_effect": congruency_effect.mean(),
+                "mean_gaze_bias": gaze_bias.mean(),
+            }
+        )
+
+    return pd.DataFrame(power)
+
+
+def design_sweep(
+    participants=SWEEP_PARTICIPANTS,
+    blocks=SWEEP_BLOCKS,
+    trials_per_block=SWEEP_TRIALS_PER_BLOCK,
+    block_orders=SWEEP_BLOCK_ORDERS,
+):
+    return [
+        {
+            "participants": n_participants,
+            "blocks": n_blocks,
+            "trials_per_block": n_trials,
+            "block_order": block_order,
+        }
+        for n_participants, n_blocks, n_trials, block_order in product(
+            participants, blocks, trials_per_block, block_orders
+        )
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Power of designs by simulation.")
+    parser.add_argument("--studies", type=int, default=STUDIES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="save the power per design to this .csv")
+    arguments = parser.parse_args()
+
+    power = estimate_power(
+        design_sweep(), n_studies=arguments.studies, max_workers=arguments.workers
+    )
+    print(power.to_string(index=False))
+
+    if arguments.output:
+        power.to_csv(arguments.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+This file contains the functions necessary for
+rendering the screens of trials to images, e.g. for stimulus checks and figures.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+The screens are drawn with the drawing code of the experiment itself (stimuli.py and
+response.py) to the back buffer of a window, read back and saved as .png (or .npy),
+without ever being shown. Trials come from a session file (data_session_X.csv) or
+from a list of TrialRecords. Each worker process of the pool opens its own window.
+
+usage (prefix with `xvfb-run` on a computer without a screen):
+
+   python snapshots.py data_session_1.csv --output snapshots --trials 1-48
+
+made by Anna van Harmelen, 2024
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from math import radians
+import argparse
+import os
+import numpy as np
+from record import TrialRecord, TRIAL_COLUMNS
+
+SCREENS = ("stimuli", "capture_cue", "probe", "response")
+TRIALS_PER_CHUNK = 50
+
+settings = None  # of the window of this worker process
+
+
+def start_worker(profile):
+    """Opens the window of a worker process."""
+    global settings
+
+    # Only needed here, so the main process doesn't have to import psychopy
+    from set_up import get_monitor_and_dir, get_offscreen_settings
+
+    monitor, _ = get_monitor_and_dir(True, profile)
+    settings = get_offscreen_settings(monitor)
+
+
+def draw_screen(screen, trial, settings):
+    """Draws one screen of a trial (a TrialRecord) the way single_trial does."""
+    from stimuli import (
+        create_stimuli_frame,
+        create_capture_cue_frame,
+        create_probe_cue_frame,
+        create_fixation_dot,
+    )
+    from response import make_dial, turn_handle
+
+    probe_form = trial.block_type
+    probe_colour = trial.target_colour if probe_form == "colour_probe" else "#d4d4d4"
+    probe_position = trial.target_bar if probe_form == "location_probe" else None
+
+    if screen == "stimuli":
+        create_stimuli_frame(
+            trial.left_orientation,
+            trial.right_orientation,
+            trial.stimuli_colours,
+            settings,
+        )
+    elif screen == "capture_cue":
+        create_capture_cue_frame(
+            trial.cue_form,
+            settings,
+            trial.capture_colour if trial.cue_form == "colour_cue" else None,
+            trial.capture_location if trial.cue_form == "location_cue" else None,
+        )
+    elif screen == "probe":
+        create_probe_cue_frame(probe_form, settings, probe_colour, probe_position)
+    elif screen == "response":
+        # The dial as it was left by the participant (or untouched, for a plan)
+        dial_circle, top_dial, bottom_dial = make_dial(
+            settings,
+            probe_position,
+            trial.target_colour if probe_form == "colour_probe" else None,
+        )
+
+        # The reported orientation is the angle the dial was turned by, whatever
+        # the step size (i.e. refresh rate) of the session was
+        if trial.report_orientation:
+            angle = radians(trial.report_orientation)
+
+            top_dial.pos = turn_handle(top_dial.pos, dial_circle.pos, angle)
+            bottom_dial.pos = turn_handle(bottom_dial.pos, dial_circle.pos, angle)
+
+        dial_circle.draw()
+        top_dial.draw()
+        bottom_dial.draw()
+        create_fixation_dot(settings)
+    else:
+        raise Exception(f"Expected one of {SCREENS}, but received {screen!r}.")
+
+
+def capture(window):
+    """Returns the back buffer as an (height, width, 3) array and clears it."""
+    image = window.getMovieFrame(buffer="back")
+    window.movieFrames.pop()  # getMovieFrame keeps every frame for saving a movie
+    window.clearBuffer()
+
+    return np.asarray(image.convert("RGB"))
+
+
+def render_trial(trial, settings, screens=SCREENS):
+    """Returns {screen: pixels} of one trial (a TrialRecord), in this process."""
+    images = {}
+    for screen in screens:
+        draw_screen(screen, trial, settings)
+        images[screen] = capture(settings["window"])
+
+    return images
+
+
+def render_chunk(trials, screens, output_directory, image_format):
+    """Renders and saves the screens of some trials (dicts), returns the saved paths."""
+    from PIL import Image
+
+    paths = []
+    for name, fields in trials:
+        images = render_trial(TrialRecord(**fields), settings, screens)
+
+        for screen, pixels in images.items():
+            path = os.path.join(output_directory, f"{name}_{screen}.{image_format}")
+            if image_format == "png":
+                Image.fromarray(pixels).save(path)
+            else:
+                np.save(path, pixels)
+            paths.append(path)
+
+    return paths
+
+
+def session_trials(path, trial_numbers=None):
+    """Reads the trials (and only `trial_numbers`, if given) of a session file."""
+    from dataset import parse_session
+
+    _, data = parse_session(None, path)
+    if trial_numbers is not None:
+        data = data[data.trial_number.isin(trial_numbers)]
+
+    session = os.path.splitext(os.path.basename(path))[0]
+    return [
+        (f"{session}_trial_{row['trial_number']}", row)
+        for row in data[list(TRIAL_COLUMNS)]
+        .astype(object)
+        .where(data[list(TRIAL_COLUMNS)].notna(), None)
+        .to_dict("records")
+    ]
+
+
+def plan_trials(records, name="plan"):
+    """Turns TrialRecords (with their block_type set) into trials to render."""
+    return [
+        (
+            f"{name}_trial_{index}",
+            {column: getattr(record, column) for column in TRIAL_COLUMNS},
+        )
+        for index, record in enumerate(records, start=1)
+    ]
+
+
+def render_trials(
+    trials,
+    output_directory,
+    screens=SCREENS,
+    image_format="png",
+    profile="lab",
+    max_workers=None,
+):
+    """
+    Renders `screens` of all trials (from session_trials or plan_trials) across a
+    process pool, using the resolution of monitor `profile`, and returns the paths.
+    """
+    if image_format not in ("png", "npy"):
+        raise Exception(f"Expected 'png' or 'npy', but received {image_format!r}.")
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    chunks = [
+        trials[start : start + TRIALS_PER_CHUNK]
+        for start in range(0, len(trials), TRIALS_PER_CHUNK)
+    ]
+
+    paths = []
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=start_worker, initargs=(profile,)
+    ) as pool:
+        for chunk_paths in pool.map(
+            render_chunk,
+            chunks,
+            [screens] * len(chunks),
+            [output_directory] * len(chunks),
+            [image_format] * len(chunks),
+        ):
+            paths.extend(chunk_paths)
+
+    return paths
+
+
+def trial_range(text):
+    """Turns e.g. '1-10,15' into [1, 2, ..., 10, 15]."""
+    numbers = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        numbers.extend(range(int(first), int(last or first) + 1))
+
+    return numbers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render trial screens to images.")
+    parser.add_argument("session_file", help="a data_session_X.csv")
+    parser.add_argument("--output", default="snapshots")
+    parser.add_argument("--trials", type=trial_range, help="e.g. 1-10,15")
+    parser.add_argument("--screens", nargs="+", choices=SCREENS, default=SCREENS)
+    parser.add_argument("--format", choices=("png", "npy"), default="png")
+    parser.add_argument("--profile", default="lab", help="monitor profile to render at")
+    parser.add_argument("--workers", type=int, default=None)
+    arguments = parser.parse_args()
+
+    paths = render_trials(
+        session_trials(arguments.session_file, arguments.trials),
+        arguments.output,
+        arguments.screens,
+        arguments.format,
+        arguments.profile,
+        arguments.workers,
+    )
+    print(f"Saved {len(paths)} images to {arguments.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+This file contains the functions necessary for
+checking that the experiment doesn't grow in memory over long sessions (a soak test).
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Runs many sessions' worth of trials through single_trial and get_response in a window,
+with a simulated participant, and samples the memory use (RSS), the memory
+traced by tracemalloc and the number of objects tracked by the garbage collector
+after every block. Fails if memory grows faster than the allowed slope.
+
+By default the waits within a trial are skipped and the window doesn't wait for the
+screen refresh, so a session takes a few minutes instead of an hour.
+
+usage (prefix with `xvfb-run` on a computer without a screen):
+
+   python soak.py --sessions 4
+
+made by Anna van Harmelen, 2024
+"""
+
+from time import perf_counter
+import argparse
+import tracemalloc
+import random
+import gc
+import sys
+import numpy as np
+import pandas as pd
+import psutil
+import response
+import trial
+from set_up import get_monitor_and_dir, get_offscreen_settings
+from conditions import (
+    N_BLOCKS,
+    TRIALS_PER_BLOCK,
+    create_blocks,
+    create_trial_list,
+    generate_stimuli_characteristics,
+)
+from trial import single_trial, show_text
+from record import trial_frame
+from warmup import warm_up
+from idle import idle_jobs
+
+WARM_UP_BLOCKS = 2  # caches fill up during the first blocks, so they're not judged
+MAX_RSS_SLOPE = 256  # in kB per block
+MAX_TRACED_SLOPE = 64  # in kB per block
+MAX_OBJECT_SLOPE = 100  # in objects per block
+RELEASE_PROBABILITY = 1 / 60  # chance per frame that the participant stops turning
+
+
+class SimulatedKeyboard:
+    """Stands in for psychopy's Keyboard: releases the dial key at a random frame."""
+
+    def clearEvents(self):
+        pass
+
+    def getKeys(self, keyList=None):
+        if random.random() < RELEASE_PROBABILITY:
+            return list(keyList or [])
+        return []
+
+
+def simulated_wait_keys(keyList=None, **kwargs):
+    """Stands in for event.waitKeys in get_response: starts turning the dial."""
+    return [random.choice(["z", "m"])]
+
+
+def skip(*args, **kwargs):
+    pass
+
+
+def memory_sample(process):
+    gc.collect()
+
+    return {
+        "rss_in_kb": process.memory_info().rss / 1024,
+        "traced_in_kb": tracemalloc.get_traced_memory()[0] / 1024,
+        "gc_objects": len(gc.get_objects()),
+    }
+
+
+def run_block(block_nr, block_type, n_trials, settings):
+    records = []
+
+    for target_bar, congruency, cue_form in create_trial_list(n_trials):
+        record = generate_stimuli_characteristics(target_bar, congruency, cue_form)
+        single_trial(record, probe_form=block_type, settings=settings, testing=True)
+        records.append(record)
+
+    # What a break screen does, without waiting for the participant
+    show_text(f"You just finished block {block_nr}.", settings["window"])
+    settings["window"].flip()
+    idle_jobs.run_all()
+
+    return records
+
+
+def soak(sessions, n_blocks=N_BLOCKS, n_trials=TRIALS_PER_BLOCK, real_time=False):
+    """Runs `sessions` sessions and returns the memory samples per block."""
+    monitor, _ = get_monitor_and_dir(True)
+    settings = get_offscreen_settings(monitor, keyboard=SimulatedKeyboard())
+
+    # Simulated participant
+    response.event.waitKeys = simulated_wait_keys
+    if not real_time:
+        trial.wait = trial.sleep = skip
+
+    process = psutil.Process()
+    tracemalloc.start()
+    warm_up(settings)
+
+    samples = []
+    trials = 0
+    first_snapshot = None
+    start = perf_counter()
+
+    for session in range(1, sessions + 1):
+        data = []
+
+        for block_nr, block_type in create_blocks(n_blocks, "LCLC"):
+            data.extend(run_block(block_nr, block_type, n_trials, settings))
+            trials += n_trials
+
+            samples.append(
+                {
+                    "session": session,
+                    "block": block_nr,
+                    "trials": trials,
+                    "minutes": (perf_counter() - start) / 60,
+                    **memory_sample(process),
+                }
+            )
+            print(
+                f"session {session} block {block_nr:>2}: "
+                f"{samples[-1]['rss_in_kb'] / 1024:.1f} MB RSS, "
+                f"{samples[-1]['traced_in_kb'] / 1024:.1f} MB traced, "
+                f"{samples[-1]['gc_objects']} objects"
+            )
+
+            if len(samples) == WARM_UP_BLOCKS:
+                first_snapshot = tracemalloc.take_snapshot()
+
+        # What saving the session does
+        trial_frame(data).to_csv(index=False)
+
+    # Show where the traced memory grew most since the warm-up blocks
+    if first_snapshot is not None:
+        print("\nLargest growth since the warm-up blocks:")
+        growth = tracemalloc.take_snapshot().compare_to(first_snapshot, "lineno")
+        for line in growth[:10]:
+            print(f"  {line}")
+
+    tracemalloc.stop()
+    settings["window"].close()
+
+    return pd.DataFrame(samples)
+
+
+def slopes(samples):
+    """Growth per block of every memory measure, ignoring the warm-up blocks."""
+    judged = samples.iloc[WARM_UP_BLOCKS:]
+    if len(judged) < 2:
+        raise Exception("Expected more blocks than WARM_UP_BLOCKS to judge the slope.")
+
+    blocks = np.arange(len(judged))
+    return {
+        measure: np.polyfit(blocks, judged[measure].to_numpy(), 1)[0]
+        for measure in ("rss_in_kb", "traced_in_kb", "gc_objects")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test of the experiment.")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--blocks", type=int, default=N_BLOCKS)
+    parser.add_argument("--trials", type=int, default=TRIALS_PER_BLOCK)
+    parser.add_argument("--real-time", action="store_true", help="keep all waits")
+    parser.add_argument("--output", help="save the samples per block to this .csv")
+    arguments = parser.parse_args()
+
+    samples = soak(
+        arguments.sessions, arguments.blocks, arguments.trials, arguments.real_time
+    )
+    if arguments.output:
+        samples.to_csv(arguments.output, index=False)
+
+    growth = slopes(samples)
+    limits = {
+        "rss_in_kb": MAX_RSS_SLOPE,
+        "traced_in_kb": MAX_TRACED_SLOPE,
+        "gc_objects": MAX_OBJECT_SLOPE,
+    }
+
+    failed = False
+    print()
+    for measure, slope in growth.items():
+        passed = slope <= limits[measure]
+        failed |= not passed
+        print(
+            f"{'ok  ' if passed else 'FAIL'} {measure}: {slope:+.1f} per block "
+            f"(at most {limits[measure]})"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
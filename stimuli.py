@@ -7,6 +7,7 @@ made by Anna van Harmelen, 2024
 """
 
 from psychopy import visual
+from tracing import traced
 
 ECCENTRICITY = 6
 DOT_SIZE = 0.1  # radius of inner circle
@@ -18,6 +19,7 @@ PROBE_CUE_SIZE = 2  # radius of circle
 decentral_dot = fixation_dot = None
 
 
+@traced()
 def create_fixation_dot(settings, colour="#eaeaea"):
     global decentral_dot, fixation_dot
 
@@ -45,6 +47,7 @@ def create_fixation_dot(settings, colour="#eaeaea"):
     fixation_dot.draw()
 
 
+@traced()
 def make_one_bar(orientation, colour, position, settings):
     # Check input
     if position == "left":
@@ -70,12 +73,14 @@ def make_one_bar(orientation, colour, position, settings):
     return bar_stimulus
 
 
+@traced()
 def create_stimuli_frame(left_orientation, right_orientation, colours, settings):
     create_fixation_dot(settings)
     make_one_bar(left_orientation, colours[0], "left", settings).draw()
     make_one_bar(right_orientation, colours[1], "right", settings).draw()
 
 
+@traced()
 def create_location_cue(position, settings):
     # Check input
     if position == "left":
@@ -96,6 +101,7 @@ def create_location_cue(position, settings):
     location_cue.draw()
 
 
+@traced()
 def create_capture_cue_frame(cue_form, settings, colour=None, position=None):
     if cue_form == "colour_cue":
         create_fixation_dot(settings, colour)
@@ -108,6 +114,7 @@ def create_capture_cue_frame(cue_form, settings, colour=None, position=None):
         )
 
 
+@traced()
 def create_probe_cue(probe_form, settings, colour, position=None):
     # Check input
     if probe_form == "location_probe":
@@ -139,6 +146,7 @@ def create_probe_cue(probe_form, settings, colour, position=None):
     probe.draw()
 
 
+@traced()
 def create_probe_cue_frame(probe_form, settings, colour, position=None):
     create_probe_cue(probe_form, settings, colour, position)
     create_fixation_dot(settings)
@@ -0,0 +1,126 @@
+"""
+This file contains the functions necessary for
+sending live trial information to a monitor for the experimenter (telemetry).
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Every event is one small JSON datagram sent to a UDP port on this computer (localhost
+only, which works on every OS). Sending never waits: when nobody is listening (or the
+listener can't keep up), the event is dropped.
+
+usage (in a second terminal, while the experiment runs):
+
+   python telemetry.py
+
+made by Anna van Harmelen, 2024
+"""
+
+from collections import deque
+from time import perf_counter
+import socket
+import json
+from tracing import tracer
+
+TELEMETRY_ADDRESS = ("127.0.0.1", 47474)
+ROLLING_TRIALS = 20  # the monitor shows averages over this many trials
+
+
+class Telemetry:
+    """
+    usage:
+
+       telemetry.publish("trial", trial_number=1, performance=80)
+       telemetry.send_trigger(eyetracker, "response_onset", trigger)
+    """
+
+    def __init__(self, address=TELEMETRY_ADDRESS):
+        self.address = address
+        self.dropped = 0
+        self.trigger_latencies = {}
+
+        try:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.setblocking(False)
+        except OSError:
+            self.socket = None
+
+    def publish(self, event, **fields):
+        if self.socket is None:
+            return
+
+        message = json.dumps({"event": event, **fields}, separators=(",", ":"))
+
+        try:
+            self.socket.sendto(message.encode(), self.address)
+        except OSError:
+            # Only counts what couldn't be sent, events nobody receives are dropped by
+            # the OS without notice
+            self.dropped += 1
+
+    def send_trigger(self, eyetracker, frame, trigger):
+        """Sends a trigger to the eyetracker and remembers how long sending took."""
+        start = perf_counter()
+        with tracer.span("trigger"):
+            eyetracker.tracker.send_message(f"trig{trigger}")
+        self.trigger_latencies[frame] = round((perf_counter() - start) * 1000, 3)
+
+    def trial_triggers(self):
+        """Returns (and resets) the trigger latencies (in ms) of the last trial."""
+        latencies = self.trigger_latencies
+        self.trigger_latencies = {}
+        return latencies
+
+
+telemetry = Telemetry()
+
+
+def monitor(address=TELEMETRY_ADDRESS):
+    """Receives the events of a running experiment and prints rolling stats."""
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(address)
+    print(f"Listening on {address[0]}:{address[1]}, press Ctrl+C to stop.")
+
+    trials = deque(maxlen=ROLLING_TRIALS)
+    dropped_frames = 0
+
+    try:
+        while True:
+            event = json.loads(receiver.recv(65536))
+
+            if event["event"] == "trial":
+                trials.append(event)
+                dropped_frames += event["dropped_frames"]
+
+                performance = sum(trial["performance"] for trial in trials) / len(trials)
+                response_time = sum(
+                    trial["response_time_in_ms"] for trial in trials
+                ) / len(trials)
+                latency = max(
+                    (max(trial["trigger_latencies"].values(), default=0) for trial in trials),
+                    default=0,
+                )
+
+                print(
+                    f"block {event['block']:>2} trial {event['trial_number']:>3} "
+                    f"| condition {event['condition_code']:>2} "
+                    f"| performance {event['performance']:>3} (mean {performance:5.1f}) "
+                    f"| RT {event['response_time_in_ms']:7.1f} ms (mean {response_time:7.1f}) "
+                    f"| dropped frames {event['dropped_frames']} (total {dropped_frames}) "
+                    f"| max trigger latency {latency:.3f} ms"
+                )
+            elif event["event"] == "response_started":
+                print(f"  response started after {event['idle_reaction_time_in_ms']:.0f} ms")
+            elif event["event"] == "fixation_broken":
+                print(
+                    f"  fixation broken during {event['phase']} ({event['reason']}), "
+                    f"{'rescheduled' if event['rescheduled'] else 'not rescheduled'}"
+                )
+            elif event["event"] == "block_end":
+                print(f"--- end of block {event['block']} ---")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
+
+
+if __name__ == "__main__":
+    monitor()
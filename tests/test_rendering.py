@@ -0,0 +1,78 @@
+"""
+Tests of the draw-call and state-change counters in rendering.py, on the stimulus
+classes of PsychoPy itself. Needs psychopy and a screen (or xvfb-run).
+"""
+
+from inspect import getattr_static
+import pytest
+
+visual = pytest.importorskip("psychopy.visual")
+
+from rendering import (  # noqa: E402
+    CountedAttribute,
+    RenderCounter,
+    STATE_ATTRIBUTES,
+    VERTEX_ATTRIBUTES,
+)
+
+# Written to every wrapped attribute that can't be written back as it was read
+VALUES = {
+    "color": "red",
+    "fillColor": "red",
+    "lineColor": "red",
+    "text": "y",
+}
+
+STIMULI = {
+    "Line": lambda window: visual.Line(window, start=(0, 0), end=(10, 10), lineWidth=2),
+    "Circle": lambda window: visual.Circle(
+        window, radius=5, edges=16, fillColor="red", lineColor="red"
+    ),
+    "TextStim": lambda window: visual.TextStim(window, text="x", height=10),
+    "ShapeStim": lambda window: visual.ShapeStim(
+        window, vertices=[(0, 0), (10, 0), (0, 10)], fillColor="red"
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def window():
+    try:
+        window = visual.Window(size=(64, 64), units="pix", checkTiming=False)
+    except Exception as error:
+        pytest.skip(f"Can't open a window: {error}")
+
+    yield window
+    window.close()
+
+
+@pytest.fixture
+def counter():
+    counter = RenderCounter()
+    counter.enable()
+    yield counter
+    counter.disable()
+
+
+@pytest.mark.parametrize("name", STIMULI)
+def test_wrapped_attributes_can_be_read_and_written(window, counter, name):
+    stim = STIMULI[name](window)
+    counter.set_phase("stimuli")
+
+    wrapped = [
+        attribute
+        for attribute in VERTEX_ATTRIBUTES + STATE_ATTRIBUTES
+        if isinstance(getattr_static(type(stim), attribute, None), CountedAttribute)
+    ]
+    assert wrapped
+
+    for attribute in wrapped:
+        kind = "vertex_updates" if attribute in VERTEX_ATTRIBUTES else "state_changes"
+        before = counter.current[kind]
+
+        value = getattr(stim, attribute)
+        setattr(stim, attribute, VALUES.get(attribute, value))
+        getattr(stim, attribute)
+
+        assert counter.current[kind] == before + 1, attribute
+
@@ -0,0 +1,174 @@
+"""
+This file contains the functions necessary for
+tracing where the time goes during a trial (drawing, waiting, triggers, responses).
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Spans are recorded with a monotonic clock (time.perf_counter_ns) into a ring buffer
+that's allocated once, when tracing is enabled. They're exported as Chrome trace
+events (JSON), which can be opened in https://ui.perfetto.dev or chrome://tracing.
+When tracing is off, a span or traced function only costs one `if`.
+
+made by Anna van Harmelen, 2024
+"""
+
+from functools import wraps
+from time import perf_counter_ns
+import threading
+import json
+import os
+import numpy as np
+
+TRACE_CAPACITY = 200_000  # spans kept at most, the oldest are overwritten
+
+SPAN_DTYPE = np.dtype(
+    [
+        ("name", np.int32),  # index into Tracer.names
+        ("thread", np.int64),
+        ("start", np.int64),  # in ns
+        ("duration", np.int64),  # in ns
+    ]
+)
+
+
+class Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exception):
+        self.tracer.record(self.name, self.start, perf_counter_ns() - self.start)
+
+
+class NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+class Tracer:
+    """
+    usage:
+
+       tracer.enable()
+
+       with tracer.span("draw"):
+           ...
+
+       @traced("dial")
+       def turn_dial(...):
+           ...
+
+       tracer.export(path)  # at a break, or at the end of the session
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = None
+        self.count = 0  # total number of spans ever recorded
+        self.exported = 0  # self.count at the last export
+        self.names = []
+        self.name_ids = {}
+        self.lock = threading.Lock()
+
+    def enable(self, capacity=TRACE_CAPACITY):
+        if self.spans is None or len(self.spans) != capacity:
+            self.spans = np.zeros(capacity, dtype=SPAN_DTYPE)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name):
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name)
+
+    def record(self, name, start, duration):
+        # EDF transfers trace from their own thread
+        with self.lock:
+            name_id = self.name_ids.get(name)
+            if name_id is None:
+                name_id = self.name_ids[name] = len(self.names)
+                self.names.append(name)
+
+            self.spans[self.count % len(self.spans)] = (
+                name_id,
+                threading.get_ident(),
+                start,
+                duration,
+            )
+            self.count += 1
+
+    def export(self, path):
+        """
+        Writes the spans recorded since the last export (as far as they're still kept)
+        to `path` as Chrome trace-event JSON, and returns how many were written.
+        """
+        if self.spans is None:
+            return 0
+
+        with self.lock:
+            count = self.count
+            first = max(self.exported, count - len(self.spans))
+            spans = self.spans[np.arange(first, count) % len(self.spans)]
+            self.exported = count
+
+        threads = {
+            thread: index for index, thread in enumerate(np.unique(spans["thread"]).tolist())
+        }
+        pid = os.getpid()
+
+        events = [
+            {
+                "name": self.names[name],
+                "ph": "X",
+                "ts": start / 1000,  # in us
+                "dur": duration / 1000,
+                "pid": pid,
+                "tid": threads[thread],
+            }
+            for name, thread, start, duration in spans.tolist()
+        ]
+
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+        return len(events)
+
+
+tracer = Tracer()
+
+
+def traced(name=None):
+    """Decorator that records every call of a function as a span."""
+
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+
+            start = perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                tracer.record(span_name, start, perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
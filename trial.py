@@ -17,50 +17,19 @@ from stimuli import (
     create_stimuli_frame,
     create_probe_cue_frame,
 )
-from eyetracker import get_trigger
-import random
+from triggers import get_trigger
+from telemetry import telemetry
+from fixation import phase_start, check_fixation
+from rendering import render_counter
+from tracing import tracer, traced
+from collections import OrderedDict
 
-COLOURS = [[19, 146, 206], [217, 103, 241], [101, 148, 14], [238, 104, 60]]
-COLOURS = [
-    [(rgb_value / 128 - 1) for rgb_value in rgb_triplet] for rgb_triplet in COLOURS
-]
+FEEDBACK_HEIGHT = 0.7  # in degrees above fixation
+TEXT_CACHE_SIZE = 32  # number of (non-feedback) text stimuli to keep
 
-
-def generate_stimuli_characteristics(target_bar, congruency, cue_form):
-    stimuli_colours = random.sample(COLOURS, 2)
-
-    orientations = [
-        random.choice([-1, 1]) * random.randint(5, 85),
-        random.choice([-1, 1]) * random.randint(5, 85),
-    ]
-
-    if target_bar == "left":
-        target_colour, distractor_colour = stimuli_colours
-        target_orientation = orientations[0]
-    else:
-        distractor_colour, target_colour = stimuli_colours
-        target_orientation = orientations[1]
-
-    if congruency == "congruent":
-        capture_colour = target_colour
-        capture_location = target_bar
-    elif congruency == "incongruent":
-        capture_colour = distractor_colour
-        capture_location = "right" if target_bar == "left" else "left"
-
-    return {
-        "ITI": random.randint(500, 800) / 1000,
-        "stimuli_colours": stimuli_colours,
-        "cue_form": cue_form,
-        "capture_colour": capture_colour,
-        "capture_location": capture_location,
-        "trial_condition": congruency,
-        "left_orientation": orientations[0],
-        "right_orientation": orientations[1],
-        "target_bar": target_bar,
-        "target_colour": target_colour,
-        "target_orientation": target_orientation,
-    }
+# Text stimuli per (text, position, colour, height), so layout only happens once
+feedback_texts = {}
+text_cache = OrderedDict()
 
 
 def do_while_showing(waiting_time, something_to_do, window):
@@ -68,132 +37,202 @@ def do_while_showing(waiting_time, something_to_do, window):
     Show whatever is drawn to the screen for exactly `waiting_time` period,
     while doing `something_to_do` in the mean time.
     """
-    window.flip()
+    with tracer.span("flip"):
+        window.flip()
     start = time()
-    something_to_do()
-    wait(waiting_time - (time() - start))
+    with tracer.span("draw"):
+        something_to_do()
+    with tracer.span("wait"):
+        wait(waiting_time - (time() - start))
 
 
+@traced("trial")
 def single_trial(
-    ITI,
-    left_orientation,
-    right_orientation,
-    target_bar,
-    target_colour,
-    target_orientation,
-    stimuli_colours,
-    cue_form,
-    capture_colour,
-    capture_location,
-    trial_condition,
+    record,
     probe_form,
     settings,
     testing,
     eyetracker=None,
+    fixation_phases=(),
 ):
+    """Runs the trial described by `record` (a TrialRecord), filling in the response."""
     # Initial fixation cross to eliminate jitter caused by for loop
+    render_counter.set_phase("iti")
     create_fixation_dot(settings)
 
     screens = [
-        (0, lambda: 0 / 0, None),  # initial one to make life easier
-        (ITI, lambda: create_fixation_dot(settings), None),
+        (0, lambda: 0 / 0, None, None),  # initial one to make life easier
+        (record.ITI, lambda: create_fixation_dot(settings), None, "iti"),
         (
             0.25,
             lambda: create_stimuli_frame(
-                left_orientation, right_orientation, stimuli_colours, settings
+                record.left_orientation,
+                record.right_orientation,
+                record.stimuli_colours,
+                settings,
             ),
             "stimuli_onset",
+            "stimuli",
         ),
-        (0.75, lambda: create_fixation_dot(settings), None),
+        (0.75, lambda: create_fixation_dot(settings), None, "delay"),
         (
             0.25,
             lambda: create_capture_cue_frame(
-                cue_form,
+                record.cue_form,
                 settings,
-                capture_colour if cue_form == "colour_cue" else None,
-                capture_location if cue_form == "location_cue" else None,
+                record.capture_colour if record.cue_form == "colour_cue" else None,
+                record.capture_location if record.cue_form == "location_cue" else None,
             ),
             "capture_cue_onset",
+            "capture_cue",
         ),
-        (1.25, lambda: create_fixation_dot(settings), None),
+        (1.25, lambda: create_fixation_dot(settings), None, "cue_delay"),
         (
             None,
             lambda: create_probe_cue_frame(
                 probe_form,
                 settings,
-                target_colour if probe_form == "colour_probe" else "#d4d4d4",
-                target_bar if probe_form == "location_probe" else None,
+                record.target_colour if probe_form == "colour_probe" else "#d4d4d4",
+                record.target_bar if probe_form == "location_probe" else None,
             ),
             None,
+            "probe",
         ),
     ]
 
     # !!! The timing you pass to do_while_showing is the timing for the previously drawn screen. !!!
 
-    for index, (duration, _, frame) in enumerate(screens[:-1]):
+    for index, (duration, _, frame, _) in enumerate(screens[:-1]):
         # Send trigger if not testing
         if not testing and frame:
             trigger = get_trigger(
-                frame, probe_form, cue_form, trial_condition, target_bar
+                frame,
+                probe_form,
+                record.cue_form,
+                record.trial_condition,
+                record.target_bar,
             )
-            eyetracker.tracker.send_message(f"trig{trigger}")
+            telemetry.send_trigger(eyetracker, frame, trigger)
+
+        # Check fixation during chosen frames (raises FixationBroken)
+        checking_fixation = not testing and frame in fixation_phases
+        if checking_fixation:
+            start_time = phase_start(eyetracker)
 
         # Draw the next screen while showing the current one
-        do_while_showing(duration, screens[index + 1][1], settings["window"])
+        render_counter.set_phase(screens[index + 1][3])
+        with tracer.span(screens[index + 1][3]):
+            do_while_showing(duration, screens[index + 1][1], settings["window"])
+
+            if checking_fixation:
+                check_fixation(eyetracker, settings, frame, start_time)
 
     # The for loop only draws the probe cue, never shows it
     # So show it here
     if not testing:
         trigger = get_trigger(
-            "probe_cue_onset", probe_form, cue_form, trial_condition, target_bar
+            "probe_cue_onset",
+            probe_form,
+            record.cue_form,
+            record.trial_condition,
+            record.target_bar,
         )
-        eyetracker.tracker.send_message(f"trig{trigger}")
+        telemetry.send_trigger(eyetracker, "probe_cue_onset", trigger)
 
     settings["window"].flip()
 
-    response = get_response(
+    get_response(
         probe_form,
-        cue_form,
-        target_orientation,
-        target_colour,
-        trial_condition,
-        target_bar,
+        record.cue_form,
+        record.target_orientation,
+        record.target_colour,
+        record.trial_condition,
+        record.target_bar,
         settings,
         testing,
         eyetracker,
+        record=record,
     )
 
     if not testing:
         trigger = get_trigger(
-            "response_offset", probe_form, cue_form, trial_condition, target_bar
+            "response_offset",
+            probe_form,
+            record.cue_form,
+            record.trial_condition,
+            record.target_bar,
         )
-        eyetracker.tracker.send_message(f"trig{trigger}")
+        telemetry.send_trigger(eyetracker, "response_offset", trigger)
 
     # Show performance
-    create_fixation_dot(settings)
-    show_text(
-        f"{response['performance']}", settings["window"], (0, settings["deg2pix"](0.7))
-    )
+    render_counter.set_phase("feedback")
+    with tracer.span("feedback"):
+        create_fixation_dot(settings)
+        show_feedback(record.performance, settings)
 
     if not testing:
         trigger = get_trigger(
-            "feedback_onset", probe_form, cue_form, trial_condition, target_bar
+            "feedback_onset",
+            probe_form,
+            record.cue_form,
+            record.trial_condition,
+            record.target_bar,
         )
-        eyetracker.tracker.send_message(f"trig{trigger}")
+        telemetry.send_trigger(eyetracker, "feedback_onset", trigger)
     settings["window"].flip()
     sleep(0.25)
+    render_counter.set_phase("other")
 
-    return {
-        "condition_code": get_trigger(
-            "just_code_please", probe_form, cue_form, trial_condition, target_bar
-        ),
-        **response,
-    }
+    return record
 
 
-def show_text(input, window, pos=(0, 0), colour="#ffffff"):
-    textstim = visual.TextStim(
-        win=window, font="Courier New", text=input, color=colour, pos=pos, height=22
-    )
+def show_text(input, window, pos=(0, 0), colour="#ffffff", height=22):
+    key = (input, tuple(pos), colour, height)
+
+    if key in feedback_texts:
+        textstim = feedback_texts[key]
+    elif key in text_cache:
+        textstim = text_cache[key]
+        text_cache.move_to_end(key)
+    else:
+        textstim = visual.TextStim(
+            win=window,
+            font="Courier New",
+            text=input,
+            color=colour,
+            pos=pos,
+            height=height,
+        )
+
+        # Forget the least recently shown text if the cache is full
+        text_cache[key] = textstim
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)
 
     textstim.draw()
+
+
+def prepare_feedback(settings):
+    """
+    Creates the text stimuli of all possible performance scores (0-100)
+    once, so showing feedback is as quick as drawing any other stimulus.
+    """
+    pos = (0, settings["deg2pix"](FEEDBACK_HEIGHT))
+
+    for performance in range(101):
+        key = (f"{performance}", pos, "#ffffff", 22)
+        if key not in feedback_texts:
+            feedback_texts[key] = visual.TextStim(
+                win=settings["window"],
+                font="Courier New",
+                text=f"{performance}",
+                color="#ffffff",
+                pos=pos,
+                height=22,
+            )
+
+
+def show_feedback(performance, settings):
+    show_text(
+        f"{performance}", settings["window"], (0, settings["deg2pix"](FEEDBACK_HEIGHT))
+    )
@@ -0,0 +1,108 @@
+"""
+This file contains the table of all eyetracker trigger codes,
+used both by the experiment (get_trigger) and by the offline parsers.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+A trigger code is the frame number followed by the condition marker, e.g. '214'
+is the capture cue onset of a colour-probe, colour-cue, congruent, right-target trial.
+
+made by Anna van Harmelen, 2024
+"""
+
+from collections import namedtuple
+from itertools import product
+
+FRAMES = {
+    "stimuli_onset": "1",
+    "capture_cue_onset": "2",
+    "probe_cue_onset": "3",
+    "response_onset": "4",
+    "response_offset": "5",
+    "feedback_onset": "6",
+}
+PROBE_FORMS = ("location_probe", "colour_probe")
+CUE_FORMS = ("location_cue", "colour_cue")
+CONGRUENCIES = ("congruent", "incongruent")
+TARGET_POSITIONS = ("left", "right")
+
+Condition = namedtuple(
+    "Condition", ["probe_form", "cue_form", "congruency", "target_position"]
+)
+Trigger = namedtuple(
+    "Trigger", ["frame", "probe_form", "cue_form", "congruency", "target_position"]
+)
+
+
+def condition_marker(probe_form, cue_form, congruency, target_position):
+    marker = {"location_probe": 1, "colour_probe": 9}[probe_form]
+
+    if cue_form == "colour_cue":
+        marker += 4
+
+    if congruency == "incongruent":
+        marker += 2
+
+    if target_position == "right":
+        marker += 1
+
+    return marker
+
+
+def build_tables():
+    """
+    Builds the (condition -> code) and (code -> condition) tables for all
+    conditions and all frames, and checks that every code is unique.
+    """
+    conditions = {}
+    for condition in map(
+        Condition._make, product(PROBE_FORMS, CUE_FORMS, CONGRUENCIES, TARGET_POSITIONS)
+    ):
+        conditions[condition] = str(condition_marker(*condition))
+
+    triggers = {}
+    for frame, frame_code in FRAMES.items():
+        for condition, code in conditions.items():
+            triggers[Trigger(frame, *condition)] = frame_code + code
+
+    for table in (conditions, triggers):
+        if len(set(table.values())) != len(table):
+            raise Exception("Two conditions share the same trigger code.")
+
+    return (
+        conditions,
+        {code: condition for condition, code in conditions.items()},
+        triggers,
+        {code: trigger for trigger, code in triggers.items()},
+    )
+
+
+CONDITION_CODES, CONDITIONS, TRIGGER_CODES, TRIGGERS = build_tables()
+
+
+def get_trigger(frame, probe_form, capture_form, congruency, target_position):
+    # All codes are looked up in the table built once below
+    if frame == "just_code_please":
+        return CONDITION_CODES[probe_form, capture_form, congruency, target_position]
+
+    return TRIGGER_CODES[frame, probe_form, capture_form, congruency, target_position]
+
+
+def encode(frame, probe_form, cue_form, congruency, target_position):
+    """Returns the trigger code (without 'trig') of a frame in a condition."""
+    return TRIGGER_CODES[frame, probe_form, cue_form, congruency, target_position]
+
+
+def decode(code):
+    """Turns a trigger code (without 'trig') back into a Trigger."""
+    try:
+        return TRIGGERS[code]
+    except KeyError:
+        raise Exception(f"Expected a known trigger code, but received {code!r}.")
+
+
+def decode_condition(code):
+    """Turns a condition code (as saved in the trial data) back into a Condition."""
+    try:
+        return CONDITIONS[str(code)]
+    except KeyError:
+        raise Exception(f"Expected a known condition code, but received {code!r}.")
@@ -0,0 +1,88 @@
+"""
+This file contains the functions necessary for
+warming up the graphics before the first timed trial.
+To run the 'location-by-colour null-cue' experiment, see main.py.
+
+Textures, shaders, fonts and vertex buffers are only made when something is drawn
+for the first time, which makes the first trial (and the first trial after a
+calibration) drop frames. So every stimulus is drawn once beforehand, to the
+back buffer only, which is then cleared without ever being shown.
+
+made by Anna van Harmelen, 2024
+"""
+
+from time import perf_counter
+from stimuli import (
+    create_fixation_dot,
+    make_one_bar,
+    create_location_cue,
+    create_probe_cue,
+)
+from response import make_dial
+from trial import prepare_feedback, show_feedback
+from conditions import COLOURS
+
+WARM_UP_FLIPS = 60  # empty frames to let the frame rate settle afterwards
+
+
+def warm_up_steps(settings):
+    """
+    Draws every stimulus offscreen, one stimulus per step. This is a generator,
+    so it can also be queued as an idle job (see idle.py) during a break.
+    """
+    window = settings["window"]
+
+    def draw_offscreen(draw):
+        draw()
+        window.clearBuffer()
+
+    # Fixation dot and capture cues in every colour
+    yield draw_offscreen(lambda: create_fixation_dot(settings))
+    for colour in COLOURS:
+        yield draw_offscreen(lambda: create_fixation_dot(settings, colour))
+
+    for position in ("left", "right"):
+        yield draw_offscreen(lambda: create_location_cue(position, settings))
+
+    # Bars in every colour and position
+    for colour in COLOURS:
+        for position in ("left", "right", "middle"):
+            yield draw_offscreen(
+                lambda: make_one_bar(45, colour, position, settings).draw()
+            )
+
+    # Probe cues and response dials
+    for position in ("left", "right"):
+        yield draw_offscreen(
+            lambda: create_probe_cue("location_probe", settings, "#d4d4d4", position)
+        )
+        yield draw_offscreen(
+            lambda: [item.draw() for item in make_dial(settings, position)]
+        )
+
+    for colour in COLOURS:
+        yield draw_offscreen(lambda: create_probe_cue("colour_probe", settings, colour))
+        yield draw_offscreen(
+            lambda: [item.draw() for item in make_dial(settings, None, colour)]
+        )
+
+    # All feedback scores
+    yield prepare_feedback(settings)
+    for performance in range(101):
+        yield draw_offscreen(lambda: show_feedback(performance, settings))
+
+
+def warm_up(settings):
+    start = perf_counter()
+
+    for _ in warm_up_steps(settings):
+        pass
+
+    # Let the swap chain settle
+    for _ in range(WARM_UP_FLIPS):
+        settings["window"].flip()
+
+    duration = perf_counter() - start
+    print(f"Warming up took {duration * 1000:.0f} ms.")
+
+    return duration